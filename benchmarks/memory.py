@@ -0,0 +1,143 @@
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jozef import Address, Birthday, Email, Name, Note, Record, _restore_field, _restore_phone
+
+
+# The layout before __slots__: every record, note and field carries its own __dict__ and
+# every note a list of Tag objects
+class DictField:
+    def __init__(self, value):
+        self.value = value
+
+
+class DictRecord:
+    def __init__(self, name):
+        self.name = DictField(name)
+        self.phones = []
+        self.birthday = None
+        self.email = None
+        self.address = None
+        self.version = 0
+        self.book = None
+
+
+class DictNote:
+    def __init__(self, text):
+        self.text = text
+        self.tags = []
+        self.creation_date = datetime.now()
+        self.modification_date = self.creation_date
+        self.id = None
+        self.version = 0
+        self.book = None
+
+
+TAGS = ["work", "home", "urgent", "done", "project", "idea", "family", "travel"]
+
+
+# A new string for every tag, the way tags read back from a file are
+def tag_text(i):
+    return TAGS[i % len(TAGS)].encode().decode()
+
+
+# Field values of the i-th generated contact
+def contact_values(i):
+    return (
+        f"Contact{i}",
+        f"0{i % 1000000000:09d}",
+        date(1950, 1, 1) + timedelta(days=i % 20000),
+        f"contact{i}@example.com",
+        f"Kyiv, Street {i % 500}, {i % 200}",
+    )
+
+
+def build_records(count):
+    records = []
+    for i in range(count):
+        name, phone, birthday, email, address = contact_values(i)
+        record = Record.__new__(Record)
+        record.name = _restore_field(Name, name)
+        record.phones = [_restore_phone(phone)]
+        record.birthday = _restore_field(Birthday, birthday)
+        record.email = _restore_field(Email, email)
+        record.address = _restore_field(Address, address)
+        record.version = 0
+        record.book = None
+        records.append(record)
+    return records
+
+
+def build_dict_records(count):
+    records = []
+    for i in range(count):
+        name, phone, birthday, email, address = contact_values(i)
+        record = DictRecord(name)
+        record.phones = [DictField(phone)]
+        record.birthday = DictField(birthday)
+        record.email = DictField(email)
+        record.address = DictField(address)
+        records.append(record)
+    return records
+
+
+def build_notes(count):
+    notes = []
+    for i in range(count):
+        note = Note(f"Note number {i}")
+        note.tags = [tag_text(i + j) for j in range(2)]
+        note.id = i
+        notes.append(note)
+    return notes
+
+
+def build_dict_notes(count):
+    notes = []
+    for i in range(count):
+        note = DictNote(f"Note number {i}")
+        note.tags = [DictField(tag_text(i + j)) for j in range(2)]
+        note.id = i
+        notes.append(note)
+    return notes
+
+
+# Bytes allocated by build(count) that are still alive afterwards
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    objects = build(count)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    gc.collect()
+    return size
+
+
+def report(label, before, after, count):
+    print(
+        f"{label:<10}{before / 2**20:>12.1f} MiB{after / 2**20:>12.1f} MiB"
+        f"{before / count:>10.0f} B{after / count:>10.0f} B{1 - after / before:>9.0%}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory taken by contacts and notes with and without __slots__.")
+    parser.add_argument("--contacts", type=int, default=1000000, help="number of contacts to build")
+    parser.add_argument("--notes", type=int, default=1000000, help="number of notes to build")
+    args = parser.parse_args()
+    print(f"{'':<10}{'__dict__':>16}{'__slots__':>16}{'dict/item':>12}{'slots/item':>12}{'saved':>9}")
+    if args.contacts:
+        report(
+            "contacts",
+            measure(build_dict_records, args.contacts),
+            measure(build_records, args.contacts),
+            args.contacts,
+        )
+    if args.notes:
+        report("notes", measure(build_dict_notes, args.notes), measure(build_notes, args.notes), args.notes)
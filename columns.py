@@ -0,0 +1,106 @@
+from datetime import timedelta
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Contacts as columns of NumPy arrays, one row per contact, so that questions about the
+# whole book are answered by array operations instead of a loop over the records. Kept
+# next to an address book like the other indexes; rows of removed contacts are reused.
+class ContactColumns:
+    keys_only = False
+
+    def __init__(self, birthday_of, domain_of, capacity=1024):
+        if numpy is None:
+            raise ImportError("The columnar mode needs NumPy: pip install numpy")
+        self.birthday_of = birthday_of
+        self.domain_of = domain_of
+        self.rows = {}
+        self.names = []
+        self.free = []
+        # Domains are stored as codes into this list
+        self.domains = []
+        self.domain_codes = {}
+        self.used = numpy.zeros(capacity, dtype=bool)
+        # Birthday as month * 100 + day, 0 when not set
+        self.birthday = numpy.zeros(capacity, dtype=numpy.int16)
+        self.domain = numpy.full(capacity, -1, dtype=numpy.int32)
+
+    def _grow(self):
+        size = len(self.used)
+        for column, fill in (("used", False), ("birthday", 0), ("domain", -1)):
+            old = getattr(self, column)
+            new = numpy.full(size * 2, fill, dtype=old.dtype)
+            new[:size] = old
+            setattr(self, column, new)
+
+    def _row(self, item_key):
+        if item_key in self.rows:
+            return self.rows[item_key]
+        if self.free:
+            row = self.free.pop()
+            self.names[row] = item_key
+        else:
+            row = len(self.names)
+            if row == len(self.used):
+                self._grow()
+            self.names.append(item_key)
+        self.rows[item_key] = row
+        return row
+
+    def update(self, item_key, item):
+        if item is None:
+            row = self.rows.pop(item_key, None)
+            if row is not None:
+                self.used[row] = False
+                self.names[row] = None
+                self.free.append(row)
+            return
+        row = self._row(item_key)
+        self.used[row] = True
+        birthday = self.birthday_of(item)
+        self.birthday[row] = birthday.month * 100 + birthday.day if birthday is not None else 0
+        domain = self.domain_of(item)
+        if domain is None:
+            self.domain[row] = -1
+        else:
+            if domain not in self.domain_codes:
+                self.domain_codes[domain] = len(self.domains)
+                self.domains.append(domain)
+            self.domain[row] = self.domain_codes[domain]
+
+    # (name, date of the next birthday) for birthdays within the given number of days
+    # from today, soonest first. A table gives the days until every month and day of the
+    # year, so the whole column is converted with a single lookup.
+    def upcoming_birthdays(self, today, days):
+        never = numpy.iinfo(numpy.int16).max
+        days_until = numpy.full(1232, never, dtype=numpy.int16)
+        for offset in range(366):
+            date = today + timedelta(days=offset)
+            month_day = date.month * 100 + date.day
+            if days_until[month_day] == never:
+                days_until[month_day] = offset
+        # Without a 29 February ahead, those birthdays fall on 28 February
+        if days_until[229] == never:
+            days_until[229] = days_until[228]
+        size = len(self.names)
+        offsets = days_until[self.birthday[:size]]
+        rows = numpy.flatnonzero((offsets < days) & self.used[:size])
+        names = self.names
+        upcoming = sorted(zip(offsets[rows].tolist(), [names[row] for row in rows.tolist()]))
+        dates = [today + timedelta(days=offset) for offset in range(min(days, 366))]
+        return [(name, dates[offset]) for offset, name in upcoming]
+
+    # Number of birthdays in every month, January first
+    def birthdays_by_month(self):
+        months = self.birthday[:len(self.names)][self.used[:len(self.names)]] // 100
+        return numpy.bincount(months, minlength=13)[1:13].tolist()
+
+    # Number of contacts with an email at every domain, most common first
+    def domain_counts(self):
+        codes = self.domain[:len(self.names)][self.used[:len(self.names)]]
+        counts = numpy.bincount(codes[codes >= 0], minlength=len(self.domains))
+        order = numpy.argsort(-counts, kind="stable")
+        return [(self.domains[code], int(counts[code])) for code in order if counts[code]]
@@ -0,0 +1,158 @@
+import csv
+import re
+from collections import deque
+
+# Contact fields by the CSV headers they are read from
+CSV_FIELDS = {
+    "name": "name",
+    "phone": "phones",
+    "phones": "phones",
+    "email": "email",
+    "birthday": "birthday",
+    "address": "address",
+}
+VCARD_EXTENSIONS = (".vcf", ".vcard")
+# Several phones in one CSV cell are separated by ; or ,
+_PHONE_LIST = re.compile(r"\s*[;,]\s*")
+_VCARD_DATE = re.compile(r"(\d{4})-?(\d\d)-?(\d\d)")
+_VCARD_PARTS = re.compile(r"(?<!\\);")
+
+
+# "vcard" or "csv", by the extension of the file
+def file_kind(filename):
+    return "vcard" if filename.lower().endswith(VCARD_EXTENSIONS) else "csv"
+
+
+# Contact field of every column of a CSV header line, None for the columns that are not imported
+def csv_header(line):
+    header = []
+    for title in next(csv.reader([line]), []):
+        field = CSV_FIELDS.get(title.strip().lower())
+        header.append(field if field not in header else None)
+    return header
+
+
+# CSV lines as (line, whether it ends a record). A quoted value may span lines; blank
+# lines between records are left out, so they are neither parsed nor counted.
+def _csv_lines(lines):
+    quoted = False
+    for line in lines:
+        if not quoted and not line.strip():
+            continue
+        if line.count('"') % 2:
+            quoted = not quoted
+        yield line, not quoted
+
+
+# Lines of a contact file in chunks of at most chunk_size contacts, as (number of contacts
+# before the chunk, lines). A chunk never ends inside a quoted CSV value or a vCard, so
+# every chunk can be parsed on its own.
+def read_chunks(lines, kind, chunk_size):
+    if kind == "csv":
+        marked = _csv_lines(lines)
+    else:
+        marked = ((line, line.strip().upper() == "END:VCARD") for line in lines)
+    chunk = []
+    first = count = 0
+    for line, ends in marked:
+        chunk.append(line)
+        if not ends:
+            continue
+        count += 1
+        if count - first == chunk_size:
+            yield first, chunk
+            chunk = []
+            first = count
+    if chunk:
+        yield first, chunk
+
+
+# Columns of the contacts in CSV lines, see csv_header()
+def parse_csv(header, lines):
+    fields = [(position, field) for position, field in enumerate(header) if field]
+    columns = {field: [] for _, field in fields}
+    for row in csv.reader(line for line, _ in _csv_lines(lines)):
+        for position, field in fields:
+            value = row[position].strip() if position < len(row) else ""
+            if field == "phones":
+                value = [phone for phone in _PHONE_LIST.split(value) if phone]
+            columns[field].append(value)
+    return columns
+
+
+def _unescape(value):
+    return value.replace("\\n", " ").replace("\\N", " ").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+
+# Lines of a vCard with the folded ones (continued on a line starting with a space) joined
+def _unfold(lines):
+    current = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+# Birthday of a vCard, 1990-03-15 or 19900315, written the way the assistant takes it
+def _vcard_birthday(value):
+    match = _VCARD_DATE.fullmatch(value)
+    if match is None:
+        return value
+    year, month, day = match.groups()
+    return f"{day}.{month}.{year}"
+
+
+# Columns of the contacts in vCard lines: FN (or N) for the name, every TEL, the first
+# EMAIL and ADR and BDAY
+def parse_vcards(lines):
+    columns = {"name": [], "phones": [], "email": [], "birthday": [], "address": []}
+    card = None
+    for line in _unfold(lines):
+        key, _, value = line.partition(":")
+        # Properties may have parameters (TEL;TYPE=cell) and a group (item1.EMAIL)
+        prop = key.split(";", 1)[0].rpartition(".")[2].upper()
+        value = value.strip()
+        if prop == "BEGIN":
+            card = {"phones": []}
+        elif card is None:
+            continue
+        elif prop == "END":
+            if "name" not in card:
+                card["name"] = card.get("n", "")
+            for field, column in columns.items():
+                column.append(card.get(field, ""))
+            card = None
+        elif prop == "FN":
+            card["name"] = _unescape(value)
+        elif prop == "N":
+            family, given = (_VCARD_PARTS.split(value) + ["", ""])[:2]
+            card["n"] = " ".join(_unescape(part) for part in (given, family) if part)
+        elif prop == "TEL":
+            card["phones"].append(value.removeprefix("tel:"))
+        elif prop == "EMAIL":
+            card.setdefault("email", value.removeprefix("mailto:"))
+        elif prop == "BDAY":
+            card["birthday"] = _vcard_birthday(value)
+        elif prop == "ADR":
+            card.setdefault("address", ", ".join(
+                part for part in (_unescape(part).strip() for part in _VCARD_PARTS.split(value)) if part
+            ))
+    return columns
+
+
+# pool.map() that keeps at most ahead calls submitted, so a long input is read only as
+# fast as its results are taken; results come in the order of the arguments
+def bounded_map(pool, function, arguments, ahead):
+    pending = deque()
+    for args in arguments:
+        pending.append(pool.submit(function, *args))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
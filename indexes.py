@@ -0,0 +1,592 @@
+import bisect
+import heapq
+import math
+from operator import itemgetter
+import re
+
+
+# Secondary indexes kept next to a book. Every index is told about each item that is added,
+# changed or removed through update(item_key, item), item being None on removal. Indexes
+# with keys_only set look at the item key alone and are given the key in place of the item.
+
+
+# Maps index keys (phone numbers, tags, ...) to the keys of the items they come from
+class InvertedIndex:
+    keys_only = False
+
+    def __init__(self, keys_of):
+        self.keys_of = keys_of
+        self.postings = {}
+        self.indexed = {}
+
+    def update(self, item_key, item):
+        new_keys = frozenset(self.keys_of(item)) if item is not None else frozenset()
+        old_keys = self.indexed.pop(item_key, frozenset())
+        for key in old_keys - new_keys:
+            items = self.postings[key]
+            items.discard(item_key)
+            if not items:
+                del self.postings[key]
+        for key in new_keys - old_keys:
+            self.postings.setdefault(key, set()).add(item_key)
+        if new_keys:
+            self.indexed[item_key] = new_keys
+
+    # Keys of the items indexed under the given key
+    def lookup(self, key):
+        return self.postings.get(key, set())
+
+    def count(self, key):
+        return len(self.postings.get(key, ()))
+
+    # Plain data to store the index with its book
+    def dump(self):
+        return self.postings
+
+    # Restore from dump() output; the per-item keys are derived from the postings
+    def load(self, postings):
+        self.postings = postings
+        self.indexed = {}
+        for key, items in postings.items():
+            for item_key in items:
+                self.indexed.setdefault(item_key, set()).add(key)
+        self.indexed = {item_key: frozenset(keys) for item_key, keys in self.indexed.items()}
+
+
+# Items ordered by one sortable value, for range queries in O(log n + k)
+class SortedIndex:
+    keys_only = False
+    # Batches from this size on are sorted in by update_many()
+    BATCH = 100
+
+    def __init__(self, value_of):
+        self.value_of = value_of
+        self.entries = []
+        # Values of the entries alone, in the same order, to bisect by value
+        self.values = []
+        self.indexed = {}
+
+    def update(self, item_key, item):
+        value = self.value_of(item) if item is not None else None
+        old_value = self.indexed.pop(item_key, None)
+        if old_value is not None:
+            position = bisect.bisect_left(self.entries, (old_value, item_key))
+            del self.entries[position]
+            del self.values[position]
+        if value is not None:
+            position = bisect.bisect_right(self.entries, (value, item_key))
+            self.entries.insert(position, (value, item_key))
+            self.values.insert(position, value)
+            self.indexed[item_key] = value
+
+    # update() for many (item key, item) pairs: a large batch is sorted in once instead of
+    # inserted one entry at a time, which moves the entries after it on every insert
+    def update_many(self, updates):
+        updates = dict(updates)
+        if len(updates) < self.BATCH:
+            for item_key, item in updates.items():
+                self.update(item_key, item)
+            return
+        removed = set()
+        for item_key, item in updates.items():
+            old_value = self.indexed.pop(item_key, None)
+            if old_value is not None:
+                removed.add((old_value, item_key))
+            value = self.value_of(item) if item is not None else None
+            if value is not None:
+                self.indexed[item_key] = value
+        if removed:
+            self.entries = [entry for entry in self.entries if entry not in removed]
+        self.entries.extend((self.indexed[item_key], item_key) for item_key in updates if item_key in self.indexed)
+        self.entries.sort()
+        self.values = [value for value, _ in self.entries]
+
+    # (value, item key) pairs with low <= value <= high, in order
+    def range(self, low, high):
+        for index in range(bisect.bisect_left(self.entries, (low,)), len(self.entries)):
+            value, item_key = self.entries[index]
+            if value > high:
+                return
+            yield value, item_key
+
+    # Number of items with low <= value <= high, without visiting them
+    def count(self, low, high):
+        return bisect.bisect_right(self.values, high) - bisect.bisect_left(self.values, low)
+
+    # Whether the item is indexed with low <= value <= high
+    def contains(self, item_key, low, high):
+        value = self.indexed.get(item_key)
+        return value is not None and low <= value <= high
+
+    # The count entries with the highest values, highest first
+    def last(self, count):
+        return self.entries[:-count - 1:-1] if count > 0 else []
+
+    # Plain data to store the index with its book
+    def dump(self):
+        return self.entries
+
+    def load(self, entries):
+        self.entries = entries
+        self.values = [value for value, _ in entries]
+        self.indexed = {item_key: value for value, item_key in entries}
+
+
+# Item keys in their own order, kept sorted as they come and go
+class KeyOrder(SortedIndex):
+    keys_only = True
+
+    def __init__(self):
+        super().__init__(lambda item_key: item_key)
+
+
+# Case-insensitive index of item keys (names) for prefix lookups and completion
+class PrefixIndex(SortedIndex):
+    keys_only = True
+
+    def __init__(self):
+        super().__init__(lambda name: name.casefold())
+
+    # Keys of the items whose name starts with the prefix, in alphabetical order
+    def starting_with(self, prefix, limit=None):
+        prefix = prefix.casefold()
+        for count, (_, item_key) in enumerate(self.range(prefix, prefix + chr(0x10FFFF))):
+            if limit is not None and count >= limit:
+                return
+            yield item_key
+
+    def count_starting_with(self, prefix):
+        prefix = prefix.casefold()
+        return self.count(prefix, prefix + chr(0x10FFFF))
+
+    def has_prefix(self, item_key, prefix):
+        return self.indexed.get(item_key, "").startswith(prefix.casefold())
+
+
+# Overlapping pieces of n characters of a text
+def ngrams(text, n=3):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+# Item keys by the n-character pieces of their values (phone numbers), for substring search.
+# A text of at least n characters can only be in values that have all of its pieces, so
+# the rarest piece gives the candidates and only those are compared with the text.
+class NgramIndex(InvertedIndex):
+    def __init__(self, values_of, n=3):
+        super().__init__(lambda item: set().union(*(ngrams(value, n) for value in values_of(item))))
+        self.values_of = values_of
+        self.n = n
+        self.values = {}
+
+    def update(self, item_key, item):
+        super().update(item_key, item)
+        values = tuple(self.values_of(item)) if item is not None else ()
+        if values:
+            self.values[item_key] = values
+        else:
+            self.values.pop(item_key, None)
+
+    # Keys of the items with a value containing the text, produced one at a time
+    def containing(self, text):
+        if len(text) < self.n:
+            # Too short to have pieces, every value is a candidate
+            postings = [self.values]
+        else:
+            postings = sorted((self.lookup(gram) for gram in ngrams(text, self.n)), key=len)
+        for item_key in list(postings[0]):
+            if all(item_key in others for others in postings[1:]) and any(text in value for value in self.values[item_key]):
+                yield item_key
+
+
+# Keys that satisfy every condition. A condition is (estimated count, keys, test): the one
+# expected to match the fewest items supplies the candidates through keys(), the others
+# only check them with test(item_key), so no condition is expanded in full but the first
+def intersect(conditions):
+    conditions = sorted(conditions, key=itemgetter(0))
+    _, keys, _ = conditions[0]
+    tests = [test for _, _, test in conditions[1:]]
+    for item_key in keys():
+        if all(test(item_key) for test in tests):
+            yield item_key
+
+
+# Number of single-character insertions, deletions and substitutions between two strings
+def edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+# Rows of a QWERTY keyboard and how far each row is shifted to the right
+_KEYBOARD_ROWS = (("1234567890-", 0.0), ("qwertyuiop", 0.5), ("asdfghjkl", 0.75), ("zxcvbnm", 1.25))
+_KEY_POSITIONS = {
+    char: (row, shift + column)
+    for row, (chars, shift) in enumerate(_KEYBOARD_ROWS)
+    for column, char in enumerate(chars)
+}
+
+
+def _keys_adjacent(a, b):
+    if a not in _KEY_POSITIONS or b not in _KEY_POSITIONS:
+        return False
+    (row_a, x_a), (row_b, x_b) = _KEY_POSITIONS[a], _KEY_POSITIONS[b]
+    return abs(row_a - row_b) <= 1 and abs(x_a - x_b) <= 1
+
+
+# Edit distance where hitting a neighbouring key costs half of any other substitution
+def keyboard_distance(a, b):
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        current = [float(i)]
+        for j, char_b in enumerate(b, 1):
+            if char_a == char_b:
+                cost = 0.0
+            else:
+                cost = 0.5 if _keys_adjacent(char_a, char_b) else 1.0
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost))
+        previous = current
+    return previous[-1]
+
+
+# Burkhard-Keller tree: words within a distance of a query are found without comparing it
+# to every word, as long as the distance is a metric
+class BKTree:
+    def __init__(self, distance, words=()):
+        self.distance = distance
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = self.distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    # (distance, word) pairs within max_distance of the word, closest first
+    def search(self, word, max_distance):
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_word, children = stack.pop()
+            distance = self.distance(word, node_word)
+            if distance <= max_distance:
+                found.append((distance, node_word))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        found.sort()
+        return found
+
+
+# Overlapping three-letter pieces of a name, padded so short names and word starts count
+def trigrams(text):
+    padded = f"  {text.casefold()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Set of non-negative integer keys (note IDs) as the bits of one integer, so that
+# intersections, unions and differences run in C over whole machine words
+def bitmap_from(keys):
+    keys = list(keys)
+    if not keys:
+        return 0
+    bits = bytearray(max(keys) // 8 + 1)
+    for key in keys:
+        bits[key >> 3] |= 1 << (key & 7)
+    return int.from_bytes(bits, "little")
+
+
+# Keys of the bits set in a bitmap, in increasing order
+def bitmap_members(bitmap):
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for position, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield position * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+# Inverted index over integer item keys that answers boolean queries such as
+# "work AND urgent NOT done" or "proj* OR (home urgent)" with bitmaps. Adjacent terms are
+# joined by AND, NOT binds tightest and OR loosest; a term ending in * stands for every key
+# starting with it. Bitmaps are made from the postings when first needed and then kept up
+# to date with them, bit by bit, as are the bitmap of all items, for NOT. With a dictionary (codes: term -> key, names: key -> term,
+# code(term) adding a term) the index is keyed by small integer codes of the terms: query
+# terms are looked up in it and dumps hold the terms themselves.
+class BitmapIndex(InvertedIndex):
+    OPERATORS = ("AND", "OR", "NOT", "(", ")")
+
+    def __init__(self, keys_of, dictionary=None):
+        super().__init__(keys_of)
+        self.dictionary = dictionary
+        self.bitmaps = {}
+        # Keys of all items, with keys or without
+        self.items = set()
+        self.all_items = None
+
+    def update(self, item_key, item):
+        old_keys = self.indexed.get(item_key, frozenset())
+        super().update(item_key, item)
+        new_keys = self.indexed.get(item_key, frozenset())
+        bit = 1 << item_key
+        for key in new_keys - old_keys:
+            if key in self.bitmaps:
+                self.bitmaps[key] |= bit
+        for key in old_keys - new_keys:
+            if key not in self.postings:
+                self.bitmaps.pop(key, None)
+            elif key in self.bitmaps:
+                self.bitmaps[key] &= ~bit
+        if self.items is not None and (item is None) == (item_key in self.items):
+            if item is None:
+                self.items.discard(item_key)
+            else:
+                self.items.add(item_key)
+            if self.all_items is not None:
+                self.all_items ^= bit
+
+    def dump(self):
+        if self.dictionary is None:
+            return self.postings, self.items
+        names = self.dictionary.names
+        return {names[key]: items for key, items in self.postings.items()}, self.items
+
+    # Dumps of older versions hold only the postings, the items are then asked for on first use
+    def load(self, dumped):
+        postings, items = dumped if isinstance(dumped, tuple) else (dumped, None)
+        if self.dictionary is not None:
+            postings = {self.dictionary.code(term): items for term, items in postings.items()}
+        super().load(postings)
+        self.bitmaps = {}
+        self.items = items
+        self.all_items = None
+
+    def bitmap(self, key):
+        if key not in self.bitmaps:
+            self.bitmaps[key] = bitmap_from(self.lookup(key))
+        return self.bitmaps[key]
+
+    # Bitmap of all items; all_keys() lists them when the index was loaded without them
+    def everything(self, all_keys):
+        if self.items is None:
+            self.items = set(all_keys())
+        if self.all_items is None:
+            self.all_items = bitmap_from(self.items)
+        return self.all_items
+
+    # Item keys matching the expression in increasing order; all_keys() gives the keys of
+    # all items and is only called for NOT on an index loaded from an older dump
+    def query(self, expression, all_keys):
+        everything = lambda: self.everything(all_keys)
+        tokens = re.findall(r"[()]|[^\s()]+", expression)
+        if not tokens:
+            raise ValueError("The query is empty.")
+        bitmap, position = self._parse_or(tokens, 0, everything)
+        if position < len(tokens):
+            raise ValueError(f"Unexpected {tokens[position]} in the query.")
+        return list(bitmap_members(bitmap))
+
+    def _parse_or(self, tokens, position, everything):
+        bitmap, position = self._parse_and(tokens, position, everything)
+        while position < len(tokens) and tokens[position] == "OR":
+            other, position = self._parse_and(tokens, position + 1, everything)
+            bitmap |= other
+        return bitmap, position
+
+    def _parse_and(self, tokens, position, everything):
+        bitmap, position = self._parse_not(tokens, position, everything)
+        while position < len(tokens) and tokens[position] not in ("OR", ")"):
+            if tokens[position] == "AND":
+                position += 1
+            other, position = self._parse_not(tokens, position, everything)
+            bitmap &= other
+        return bitmap, position
+
+    def _parse_not(self, tokens, position, everything):
+        if position < len(tokens) and tokens[position] == "NOT":
+            bitmap, position = self._parse_not(tokens, position + 1, everything)
+            return everything() & ~bitmap, position
+        return self._parse_term(tokens, position, everything)
+
+    def _parse_term(self, tokens, position, everything):
+        if position >= len(tokens):
+            raise ValueError("The query ends too early.")
+        token = tokens[position]
+        if token == "(":
+            bitmap, position = self._parse_or(tokens, position + 1, everything)
+            if position >= len(tokens) or tokens[position] != ")":
+                raise ValueError("A ( in the query is not closed.")
+            return bitmap, position + 1
+        if token in self.OPERATORS:
+            raise ValueError(f"Unexpected {token} in the query.")
+        if token.endswith("*"):
+            names = self.dictionary.names if self.dictionary is not None else None
+            bitmap = 0
+            for key in self.postings:
+                if (names[key] if names is not None else key).startswith(token[:-1]):
+                    bitmap |= self.bitmap(key)
+            return bitmap, position + 1
+        if self.dictionary is not None:
+            token = self.dictionary.codes.get(token)
+        return self.bitmap(token), position + 1
+
+
+# Index of item keys (names) by trigram for approximate matching
+class TrigramIndex(InvertedIndex):
+    keys_only = True
+    # Trigrams shared by more names than this say little and are skipped to bound the cost
+    MAX_POSTINGS = 10000
+
+    def __init__(self):
+        super().__init__(trigrams)
+
+    # Keys most similar to the text: ranked by shared trigrams, then by edit distance
+    def similar(self, text, limit=5, min_similarity=0.3):
+        query = trigrams(text)
+        usable = [gram for gram in query if len(self.lookup(gram)) <= self.MAX_POSTINGS]
+        if not usable and query:
+            # Every trigram is common: only the rarest one is read, never all of them
+            usable = [min(query, key=self.count)]
+        shared = {}
+        for gram in usable:
+            for item_key in self.lookup(gram):
+                shared[item_key] = shared.get(item_key, 0) + 1
+        scored = []
+        for item_key, count in shared.items():
+            similarity = 2 * count / (len(query) + len(self.indexed[item_key]))
+            if similarity >= min_similarity:
+                scored.append((similarity, item_key))
+        folded = text.casefold()
+        best = heapq.nlargest(limit * 4, scored)
+        best.sort(key=lambda pair: (edit_distance(folded, pair[1].casefold()), -pair[0]))
+        return [item_key for _, item_key in best[:limit]]
+
+
+# Lower-case words of a text, the unit of full-text search
+def tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+
+# Full-text index with BM25 ranking. A query is a list of words, "quoted phrases" and
+# prefixes (word*); a result has to match every part of the query.
+class TextIndex:
+    keys_only = False
+    K1 = 1.2
+    B = 0.75
+    MAX_PREFIX_TERMS = 100
+
+    def __init__(self, text_of):
+        self.text_of = text_of
+        self.postings = {}
+        self.doc_terms = {}
+        self.lengths = {}
+        self.total_length = 0
+        self.terms = []
+
+    def update(self, item_key, item):
+        self._remove(item_key)
+        if item is not None:
+            self._add(item_key, tokenize(self.text_of(item)))
+
+    def _add(self, item_key, tokens):
+        if not tokens:
+            return
+        self.lengths[item_key] = len(tokens)
+        self.total_length += len(tokens)
+        self.doc_terms[item_key] = set(tokens)
+        for position, term in enumerate(tokens):
+            docs = self.postings.get(term)
+            if docs is None:
+                docs = self.postings[term] = {}
+                bisect.insort(self.terms, term)
+            docs.setdefault(item_key, []).append(position)
+
+    def _remove(self, item_key):
+        if item_key not in self.lengths:
+            return
+        self.total_length -= self.lengths.pop(item_key)
+        for term in self.doc_terms.pop(item_key):
+            docs = self.postings[term]
+            del docs[item_key]
+            if not docs:
+                del self.postings[term]
+                del self.terms[bisect.bisect_left(self.terms, term)]
+
+    # Best matches as (item key, score) pairs, highest score first
+    def search(self, query, limit=10):
+        parts = []
+        for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+            if phrase:
+                parts.append((self._phrase_scores, tokenize(phrase)))
+            elif word.endswith("*"):
+                parts.append((self._prefix_scores, tokenize(word[:-1])[:1]))
+            else:
+                parts.extend((self._term_scores, [term]) for term in tokenize(word))
+        parts = [(score, tokens) for score, tokens in parts if tokens]
+        if not parts:
+            return []
+        scores = None
+        for score, tokens in parts:
+            part_scores = score(tokens)
+            if scores is not None:
+                part_scores = {key: scores[key] + value for key, value in part_scores.items() if key in scores}
+            scores = part_scores
+            if not scores:
+                return []
+        return heapq.nlargest(limit, scores.items(), key=lambda pair: pair[1])
+
+    def _bm25(self, term, item_key, frequency):
+        count = len(self.lengths)
+        docs = len(self.postings[term])
+        idf = math.log(1 + (count - docs + 0.5) / (docs + 0.5))
+        length_ratio = self.lengths[item_key] / (self.total_length / count)
+        return idf * frequency * (self.K1 + 1) / (frequency + self.K1 * (1 - self.B + self.B * length_ratio))
+
+    def _term_scores(self, tokens):
+        term = tokens[0]
+        docs = self.postings.get(term, {})
+        return {key: self._bm25(term, key, len(positions)) for key, positions in docs.items()}
+
+    def _prefix_scores(self, tokens):
+        prefix = tokens[0]
+        scores = {}
+        start = bisect.bisect_left(self.terms, prefix)
+        for term in self.terms[start:start + self.MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            for key, positions in self.postings[term].items():
+                scores[key] = scores.get(key, 0.0) + self._bm25(term, key, len(positions))
+        return scores
+
+    # Items containing the words next to each other, scored as the sum of the words
+    def _phrase_scores(self, tokens):
+        postings = [self.postings.get(term) for term in tokens]
+        if not all(postings):
+            return {}
+        candidates = min(postings, key=len).keys()
+        scores = {}
+        for key in candidates:
+            if not all(key in docs for docs in postings):
+                continue
+            following = [set(docs[key]) for docs in postings[1:]]
+            matches = sum(
+                1 for start in postings[0][key]
+                if all(start + offset + 1 in positions for offset, positions in enumerate(following))
+            )
+            if matches:
+                scores[key] = sum(self._bm25(term, key, matches) for term in tokens)
+        return scores
@@ -1,24 +1,63 @@
+import argparse
+import calendar
 import readline
 from collections import UserDict
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+import heapq
+from itertools import starmap
+import os
 import re
-from datetime import datetime, timedelta
+import shlex
+import sqlite3
+import struct
+import sys
+import threading
+from datetime import datetime, time, timedelta
 import datetime as dt
 import pickle
 from prettytable import PrettyTable
+from columns import ContactColumns, numpy
+from importer import bounded_map, csv_header, file_kind, parse_csv, parse_vcards, read_chunks
+from indexes import (
+    BitmapIndex, BKTree, InvertedIndex, KeyOrder, NgramIndex, PrefixIndex, SortedIndex, TextIndex, TrigramIndex, intersect, keyboard_distance,
+    ngrams, tokenize,
+)
+from storage import AutoSaver, BackgroundSave, FileLock, Journal, SnapshotFile, atomic_write, encode_snapshot, pack_strings, unpack_strings
 
 
 
 # Base class for different fields like Name, Phone, Birthday
 class Field:
+    # Fields hold a single value, without a __dict__ per field
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
     def __str__(self):
         return str(self.value)
 
+    # Pickled as {"value": ...}, the same as before fields had slots
+    def __getstate__(self):
+        return {"value": self.value}
+
+    def __setstate__(self, state):
+        self.value = state["value"]
+
+
+# Recreate an already validated field without running its checks again
+def _restore_field(cls, value):
+    field = cls.__new__(cls)
+    field.value = value
+    return field
+
 
 # Class for Name field validation
 class Name(Field):
+    __slots__ = ()
+
     def __init__(self, value):
         if not value or not isinstance(value, str):
             raise ValueError("Name must be a non-empty string")
@@ -26,88 +65,338 @@ class Name(Field):
     pass
 
 
-# Class for Phone field validation
+# Length of the phone pieces kept for search by part of a number
+PHONE_GRAM = 3
+
+
+# Digits of a phone number, so that differently formatted numbers compare equal
+def normalize_phone(phone):
+    return re.sub(r"\D", "", phone)
+
+
+# Country code given to national numbers, the ones written without + or 00
+DEFAULT_COUNTRY_CODE = "380"
+PHONE_FORMAT_ERROR = "Invalid phone number format. Use 10 digits like 0501234567 or +380501234567."
+_PHONE_SEPARATORS = re.compile(r"[\s\-.()]")
+# 0 and nine digits, or the same nine digits after the country code
+_NATIONAL_PHONE = re.compile(r"0(\d{9})")
+_DOMESTIC_PHONE = re.compile(DEFAULT_COUNTRY_CODE + r"\d{9}")
+# Any country after + or 00
+_INTERNATIONAL_PHONE = re.compile(r"(?:\+|00)([1-9]\d{6,14})")
+
+
+# E.164 form of a phone number as an integer: "(050) 123-45-67" and "+380 50 123 45 67"
+# both give 380501234567. A number without + or 00 must be a national one, 0 and nine
+# digits, which loses its 0 and gets the default country code, or already start with it.
+def canonical_phone(phone):
+    phone = _PHONE_SEPARATORS.sub("", phone)
+    # Ten digits are always a national number, even when they start with 00
+    national = _NATIONAL_PHONE.fullmatch(phone)
+    if national is not None:
+        return int(DEFAULT_COUNTRY_CODE + national.group(1))
+    if _DOMESTIC_PHONE.fullmatch(phone):
+        return int(phone)
+    international = _INTERNATIONAL_PHONE.fullmatch(phone)
+    if international is None:
+        raise ValueError(PHONE_FORMAT_ERROR)
+    return int(international.group(1))
+
+
+# canonical_phone() for values that may not be phone numbers at all, None for those
+def phone_number(phone):
+    try:
+        return canonical_phone(phone)
+    except ValueError:
+        return None
+
+
+# Class for Phone field validation. The number is kept both as entered, for display, and
+# canonicalized to an integer, for comparisons and indexes.
 class Phone(Field):
+    __slots__ = ("number",)
+
     def __init__(self, value):
-        if not self.is_valid_phone(value):
-            raise ValueError("Invalid phone number format. It should be 10 digits.")
+        self.number = canonical_phone(value)
         super().__init__(value)
 
     # Static method to validate phone number format
     @staticmethod
     def is_valid_phone(phone):
-        return re.fullmatch(r"\d{10}", phone) is not None
+        return phone_number(phone) is not None
+
+    # The number is not pickled, it follows from the value
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.number = phone_number(self.value)
+
+
+# Recreate an already validated phone, phones saved by older versions may not be canonical yet
+def _restore_phone(value, number=None):
+    phone = _restore_field(Phone, value)
+    phone.number = phone_number(value) if number is None else number
+    return phone
+
+
+# Digit strings a phone is found by in part: its E.164 digits and, for the default country,
+# the national form with the leading 0
+def phone_search_forms(phone):
+    if phone.number is None:
+        return [normalize_phone(phone.value)]
+    digits = str(phone.number)
+    if digits.startswith(DEFAULT_COUNTRY_CODE):
+        return [digits, "0" + digits[len(DEFAULT_COUNTRY_CODE):]]
+    return [digits]
+
+
+EMAIL_FORMAT_ERROR = "Invalid email format."
+_EMAIL = re.compile(r"[^@]+@[^@]+\.[^@]+")
 
 
 class Email(Field):
+    __slots__ = ()
+
     def __init__(self, value):
         if not self.is_valid_email(value):
-            raise ValueError("Invalid email format.")
+            raise ValueError(EMAIL_FORMAT_ERROR)
         super().__init__(value)
 
     # Static method to validate email format
     @staticmethod
     def is_valid_email(email):
-        return re.fullmatch(r"[^@]+@[^@]+\.[^@]+", email) is not None
+        return _EMAIL.fullmatch(email) is not None
 
 
 class Address(Field):
+    __slots__ = ()
+
     def __init__(self, value):
         if not value or not isinstance(value, str):
             raise ValueError("Address must be a non-empty string.")
         super().__init__(value)
 
 
+BIRTHDAY_FORMAT_ERROR = "Invalid date format. Use DD.MM.YYYY"
+_BIRTHDAY = re.compile(r"(\d\d)\.(\d\d)\.(\d{4})")
+
+
+# Date of a DD.MM.YYYY string. The usual two-digit day and month are taken apart by a
+# precompiled pattern, strptime() is only left the rarer spellings such as 1.3.2000.
+def parse_birthday(value):
+    match = _BIRTHDAY.fullmatch(value)
+    try:
+        if match is not None:
+            day, month, year = match.groups()
+            return dt.date(int(year), int(month), int(day))
+        return datetime.strptime(value, "%d.%m.%Y").date()
+    except ValueError:
+        raise ValueError(BIRTHDAY_FORMAT_ERROR) from None
+
+
 # Class for Birthday field validation
 class Birthday(Field):
+    __slots__ = ()
+
     def __init__(self, value):
-        try:
-            self.value = datetime.strptime(value, "%d.%m.%Y").date()
-        except ValueError:
-            raise ValueError("Invalid date format. Use DD.MM.YYYY")
+        self.value = parse_birthday(value)
 
     def __str__(self):
         return self.value.strftime("%d.%m.%Y")
 
 
+NAME_ERROR = "Name must be a non-empty string"
+
+
+def _checked_text(error):
+    def check(value):
+        if not isinstance(value, str):
+            raise ValueError(error)
+        return value
+    return check
+
+
+def _checked_phones(phones):
+    return [canonical_phone(phone) for phone in phones]
+
+
+def _checked_email(value):
+    if _EMAIL.fullmatch(value) is None:
+        raise ValueError(EMAIL_FORMAT_ERROR)
+    return value
+
+
+# Checks of every contact field for validate_columns(), each returning the value the field
+# keeps: the text for names, emails and addresses, the E.164 number for phones and the date
+# for birthdays
+CONTACT_VALIDATORS = {
+    "name": _checked_text(NAME_ERROR),
+    "phone": canonical_phone,
+    "phones": _checked_phones,
+    "email": _checked_email,
+    "birthday": parse_birthday,
+    "address": _checked_text("Address must be a non-empty string."),
+}
+
+
+# Validate contact input a column at a time, e.g. {"name": [...], "phone": [...]} with one
+# value per row and None or "" where a row has none. Every name is required, the other
+# fields are optional; "phones" holds lists of numbers. Returns the numbers of the valid rows, the checked columns holding
+# only those rows and (row, field, message) for every invalid value.
+def validate_columns(columns):
+    if "name" not in columns:
+        raise ValueError("The name column is required.")
+    size = max(len(values) for values in columns.values())
+    checked = {}
+    errors = []
+    for field, values in columns.items():
+        validate = CONTACT_VALIDATORS.get(field)
+        if validate is None:
+            raise ValueError(f"Unknown contact field {field}.")
+        column = checked[field] = [None] * size
+        for row, value in enumerate(values):
+            if not value:
+                if field == "name":
+                    errors.append((row, field, NAME_ERROR))
+                continue
+            try:
+                column[row] = validate(value)
+            except ValueError as error:
+                errors.append((row, field, str(error)))
+    if not errors:
+        return list(range(size)), checked, errors
+    errors.sort()
+    invalid = {row for row, _, _ in errors}
+    rows = [row for row in range(size) if row not in invalid]
+    return rows, {field: [column[row] for row in rows] for field, column in checked.items()}, errors
+
+
+# Version, birthday ordinal (0 when not set) and number of phones at the start of a binary record
+_RECORD_HEADER = struct.Struct("<IIH")
+
+
 # Class to represent a contact record
 class Record:
+    __slots__ = ("name", "phones", "birthday", "email", "address", "version", "book")
+    # Values of the fields that records pickled by older versions may lack
+    _DEFAULTS = {"birthday": None, "email": None, "address": None, "version": 0}
+
     def __init__(self, name):
         self.name = Name(name)
         self.phones = []
         self.birthday = None
         self.email = None
         self.address = None
+        self.version = 0
+        self.book = None
+
+    # The owning book is not part of the pickled record, which stays a plain dict of fields
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__ if slot != "book"}
+
+    # Records pickled by older versions may lack some of the fields
+    def __setstate__(self, state):
+        for slot, value in {**self._DEFAULTS, **state}.items():
+            if slot in self.__slots__:
+                setattr(self, slot, value)
+        self.book = None
+
+    # Let the owning book know the record has been modified
+    def _changed(self):
+        if self.book is not None:
+            self.book.record_changed(self)
+
+    # Take the phones this record lacks and the fields that are set from another record,
+    # without committing the change, for merges that write many records at once
+    def merge(self, other):
+        numbers = {phone.number for phone in self.phones}
+        for phone in other.phones:
+            if phone.number not in numbers:
+                numbers.add(phone.number)
+                self.phones.append(phone)
+        for field in ("birthday", "email", "address"):
+            value = getattr(other, field)
+            if value is not None:
+                setattr(self, field, value)
+
+    # Compact representation of the record used by the journal
+    def serialize(self):
+        return {
+            "name": self.name.value,
+            "phones": [p.value for p in self.phones],
+            "birthday": str(self.birthday) if self.birthday else None,
+            "email": self.email.value if self.email else None,
+            "address": self.address.value if self.address else None,
+            "version": self.version,
+        }
 
-    # Add a phone number to the record
+    # Rebuild a record from serialize() output, values were validated when first entered
+    @classmethod
+    def deserialize(cls, state):
+        record = cls(state["name"])
+        record.phones = [_restore_phone(p) for p in state["phones"]]
+        if state["birthday"]:
+            record.birthday = Birthday(state["birthday"])
+        if state["email"]:
+            record.email = _restore_field(Email, state["email"])
+        if state["address"]:
+            record.address = _restore_field(Address, state["address"])
+        record.version = state.get("version", 0)
+        return record
+
+    # Binary form used by snapshots, the name is stored as the entry key
+    def to_bytes(self):
+        strings = [self.email.value if self.email else "", self.address.value if self.address else ""]
+        strings.extend(p.value for p in self.phones)
+        ordinal = self.birthday.value.toordinal() if self.birthday else 0
+        return _RECORD_HEADER.pack(self.version, ordinal, len(self.phones)) + pack_strings(strings)
+
+    @classmethod
+    def from_bytes(cls, name, payload):
+        version, ordinal, phone_count = _RECORD_HEADER.unpack_from(payload)
+        email, address, *phones = unpack_strings(payload, _RECORD_HEADER.size, phone_count + 2)
+        record = cls(name)
+        record.phones = [_restore_phone(p) for p in phones]
+        if ordinal:
+            record.birthday = _restore_field(Birthday, dt.date.fromordinal(ordinal))
+        if email:
+            record.email = _restore_field(Email, email)
+        if address:
+            record.address = _restore_field(Address, address)
+        record.version = version
+        return record
+
+    # Add a phone number to the record, the same number is kept only once in any format
     def add_phone(self, phone):
-        self.phones.append(Phone(phone))
+        phone = Phone(phone)
+        if self.find_phone(phone.value) is not None:
+            raise ValueError(f"Phone {phone.value} already exists.")
+        self.phones.append(phone)
+        self._changed()
 
     # Remove a phone number from the record
     def remove_phone(self, phone):
-        for p in self.phones:
-            if p.value == phone:
-                self.phones.remove(p)
-                return
-        raise ValueError(f"Phone {phone} not found.")
+        p = self.find_phone(phone)
+        if p is None:
+            raise ValueError(f"Phone {phone} not found.")
+        self.phones.remove(p)
+        self._changed()
 
     # Edit an existing phone number with a new one
     def edit_phone(self, old_phone, new_phone):
-        found = False
-        for p in self.phones:
-            if p.value == old_phone:
-                p.value = new_phone
-                found = True
-                break
-        if not found:
+        new_phone = Phone(new_phone)
+        p = self.find_phone(old_phone)
+        if p is None:
             raise ValueError(f"Phone {old_phone} not found.")
-        if not Phone.is_valid_phone(new_phone):
-            raise ValueError("Invalid phone number format. It should be 10 digits.")
-        
-    # Search for an existing phone number in records
+        existing = self.find_phone(new_phone.value)
+        if existing is not None and existing is not p:
+            raise ValueError(f"Phone {new_phone.value} already exists.")
+        self.phones[self.phones.index(p)] = new_phone
+        self._changed()
+
+    # Search for an existing phone number in records, written in any format
     def find_phone(self, phone):
+        number = phone_number(phone)
         for p in self.phones:
-            if p.value == phone:
+            if p.value == phone or (number is not None and p.number == number):
                 return p
         return None
     # Add an email to the record
@@ -115,18 +404,21 @@ class Record:
         if self.email:
             raise ValueError("Email already exists. Use edit_email to change it.")
         self.email = Email(email)
+        self._changed()
 
     # Edit the existing email
     def edit_email(self, new_email):
         if not self.email:
             raise ValueError("No email to edit. Use add_email to add one.")
         self.email = Email(new_email)
+        self._changed()
 
     # Remove the email
     def remove_email(self):
         if not self.email:
             raise ValueError("No email to remove.")
         self.email = None
+        self._changed()
 
     # Search for an email
     def find_email(self):
@@ -137,18 +429,21 @@ class Record:
         if self.address:
             raise ValueError("Address already exists. Use edit_address to change it.")
         self.address = Address(address)
+        self._changed()
 
     # Edit the existing address
     def edit_address(self, new_address):
         if not self.address:
             raise ValueError("No address to edit. Use add_address to add one.")
         self.address = Address(new_address)
+        self._changed()
 
     # Remove the address
     def remove_address(self):
         if not self.address:
             raise ValueError("No address to remove.")
         self.address = None
+        self._changed()
 
     # Search for an address
     def find_address(self):
@@ -157,6 +452,7 @@ class Record:
     # Add a birthday to the record
     def add_birthday(self, birthday):
         self.birthday = Birthday(birthday)
+        self._changed()
 
     # String representation of the record
     def __str__(self):
@@ -175,45 +471,852 @@ class Record:
             "Address": str(self.address) if self.address else "N/A",
         }
 
+# Next date a birthday is celebrated on or after today, 29 February falls on 28 February in common years
+def _next_birthday(birthday, today):
+    for year in (today.year, today.year + 1):
+        try:
+            next_date = birthday.replace(year=year)
+        except ValueError:
+            next_date = birthday.replace(year=year, day=28)
+        if next_date >= today:
+            return next_date
+
+
+# Raised when another session changed the same record first
+class ConflictError(ValueError):
+    pass
+
+
+# Birthday as a month and day number (MMDD) that sorts in calendar order
+def _month_day(date):
+    return date.month * 100 + date.day
+
+
+# Calendar windows (first MMDD, last MMDD) covering the given number of days from today
+def _birthday_windows(today, days):
+    last = today + timedelta(days=min(days, 366) - 1)
+    if last.year == today.year:
+        windows = [(_month_day(today), _month_day(last))]
+    else:
+        windows = [(_month_day(today), 1231), (101, _month_day(last))]
+    # 29 February birthdays fall on 28 February in common years
+    if last.month == 2 and last.day == 28 and not calendar.isleap(last.year):
+        windows[-1] = (windows[-1][0], 229)
+    return windows
+
+
+# Calendar windows (first MMDD, last MMDD) from one day of the year to another, over New Year if needed
+def _date_windows(start, end):
+    low, high = _month_day(start), _month_day(end)
+    if low <= high:
+        return [(low, high)]
+    return [(low, 1231), (101, high)]
+
+
+# Domain of an email address, the part that follows @
+def email_domain(email):
+    return email.rpartition("@")[2].casefold()
+
+
+# Apply (item key, item) pairs to an index, in one batch when the index can take one
+def _update_index(index, updates):
+    if hasattr(index, "update_many"):
+        index.update_many(updates)
+    else:
+        for key, item in updates:
+            index.update(key, item)
+
+
+# Base class for books whose changes are written to a journal
+class Book(UserDict):
+    item_class = None
+    snapshot_kind = 0
+    # Secondary indexes by name, each built on first use by calling its factory
+    index_factories = {}
+    # Indexes saved in pickled snapshots so they are not rebuilt on every load
+    persisted_indexes = ()
+
+    def __init__(self, *args, **kwargs):
+        self.journal = None
+        self.journal_seq = 0
+        self.filename = None
+        self.background_save = None
+        self.dirty = set()
+        self.autosave = None
+        self.lock = None
+        self.snapshot_lock = None
+        self.indexes = {}
+        super().__init__(*args, **kwargs)
+
+    # Only the items, the journal position and the persisted indexes are pickled
+    def __getstate__(self):
+        data = self.data if isinstance(self.data, dict) else dict(self.data)
+        indexes = {name: self._index(name).dump() for name in self.persisted_indexes}
+        return {"data": data, "journal_seq": self.journal_seq, "indexes": indexes}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.journal_seq = state.get("journal_seq", 0)
+        for key, item in state["data"].items():
+            self._adopt(key, item)
+        self.data = state["data"]
+        for name, dumped in state.get("indexes", {}).items():
+            if name in self.index_factories:
+                self.indexes[name] = self.index_factories[name]()
+                self.indexes[name].load(dumped)
+
+    # Attach an item restored from disk to this book
+    def _adopt(self, key, item):
+        item.book = self
+        return item
+
+    # Keys of binary snapshot entries, their byte order is the order of entries in the file
+    def encode_key(self, key):
+        return key.encode("utf-8")
+
+    def decode_key(self, data):
+        return str(data, "utf-8")
+
+    def decode_item(self, key, payload):
+        key = self.decode_key(key)
+        return self._adopt(key, self.item_class.from_bytes(key, payload))
+
+    # Sorted (key, payload) pairs for a binary snapshot
+    def snapshot_entries(self):
+        if isinstance(self.data, SnapshotRecords):
+            return self.data.entries()
+        return sorted((self.encode_key(key), item.to_bytes()) for key, item in self.data.items())
+
+    # Apply the changes other sessions wrote to the journal since the last sync, returns their keys
+    def sync(self):
+        changed = set()
+        if self.journal is None:
+            return changed
+        for entry in self.journal.read_new():
+            if entry["seq"] > self.journal_seq:
+                self.apply_entry(entry)
+                changed.add(entry["key"])
+        return changed
+
+    # Called after every command; journaled books leave saving to the autosave
+    def command_done(self):
+        pass
+
+    # Pick up the changes other sessions made since the last command
+    def refresh(self):
+        with self.shared():
+            pass
+
+    # Hold the cross-process lock and catch up with other sessions, yields the keys they changed
+    @contextmanager
+    def shared(self):
+        if self.lock is None:
+            yield set()
+            return
+        with self.lock:
+            yield self.sync()
+
+    # Write a new version of an item unless another session changed it after we read it
+    def _commit(self, key, item, what):
+        with self.shared():
+            current = self.data.get(key)
+            if current is None or current.version != item.version:
+                raise ConflictError(f"{what} was changed in another session, please try again.")
+            item.version += 1
+            self._log("put", key, item.serialize())
+
+    # Append a change to the journal so it survives a crash
+    def _log(self, op, key, state=None):
+        self._log_many(op, {key: state})
+
+    # Append changes of several items, {key: state}, to the journal with a single write
+    def _log_many(self, op, states):
+        entries = []
+        for key, state in states.items():
+            self.journal_seq += 1
+            entries.append({"seq": self.journal_seq, "op": op, "key": key, "state": state})
+        if self.journal is not None:
+            self.journal.append_many(entries)
+        self._items_changed(states)
+
+    def _item_changed(self, key):
+        self._items_changed((key,))
+
+    # Remember the keys until the next flush, update the indexes and let the autosave know
+    def _items_changed(self, keys):
+        self.dirty.update(keys)
+        self._reindex_many(keys)
+        if self.autosave is not None:
+            self.autosave.changed()
+
+    # Index with the given name, built from all items the first time it is needed
+    def _index(self, name):
+        if name not in self.indexes:
+            index = self.index_factories[name]()
+            # Lazy storages list their keys without loading the items
+            updates = ((key, key) for key in self.data) if index.keys_only else self.data.items()
+            _update_index(index, updates)
+            self.indexes[name] = index
+        return self.indexes[name]
+
+    # Bring the built indexes in line with the current state of one item
+    def _reindex(self, key):
+        self._reindex_many((key,))
+
+    # Same for several items, one index at a time
+    def _reindex_many(self, keys):
+        if self.indexes:
+            items = [(key, self.data.get(key)) for key in keys]
+            for index in self.indexes.values():
+                _update_index(index, ((key, key if index.keys_only and item is not None else item) for key, item in items))
+
+    # Replay one journal entry, entries already covered by the snapshot are skipped
+    def apply_entry(self, entry):
+        if entry["seq"] <= self.journal_seq:
+            return
+        if entry["op"] == "put":
+            self.data[entry["key"]] = self._adopt(entry["key"], self.item_class.deserialize(entry["state"]))
+        elif entry["op"] == "del":
+            self.data.pop(entry["key"], None)
+        self.journal_seq = entry["seq"]
+        self._reindex(entry["key"])
+
+    # Query condition on an inverted index: the items indexed under one key
+    def _lookup_condition(self, index_name, key):
+        postings = self._index(index_name).lookup(key)
+        return len(postings), lambda: postings, postings.__contains__
+
+    # Query condition on a sorted index: the items with a value within any of the windows
+    def _range_condition(self, index_name, windows):
+        index = self._index(index_name)
+        return (
+            sum(index.count(low, high) for low, high in windows),
+            lambda: (item_key for low, high in windows for _, item_key in index.range(low, high)),
+            lambda item_key: any(index.contains(item_key, low, high) for low, high in windows),
+        )
+
+
 # Address book class to hold all records
-class AddressBook(UserDict):
+class AddressBook(Book):
+    item_class = Record
+    snapshot_kind = 1
+    index_factories = {
+        "phone": lambda: InvertedIndex(lambda record: [p.number for p in record.phones if p.number is not None]),
+        "phone_part": lambda: NgramIndex(
+            lambda record: [form for p in record.phones for form in phone_search_forms(p)], PHONE_GRAM
+        ),
+        "birthday": lambda: SortedIndex(lambda record: _month_day(record.birthday.value) if record.birthday else None),
+        "name": PrefixIndex,
+        "similar": TrigramIndex,
+        "domain": lambda: InvertedIndex(lambda record: [email_domain(record.email.value)] if record.email else []),
+        "address": lambda: InvertedIndex(lambda record: tokenize(record.address.value) if record.address else []),
+        "columns": lambda: ContactColumns(
+            lambda record: record.birthday.value if record.birthday else None,
+            lambda record: email_domain(record.email.value) if record.email else None,
+        ),
+    }
+    # Answer book-wide questions from NumPy columns instead of the records (needs NumPy)
+    columnar = False
+
     def add_record(self, record):
-        self.data[record.name.value] = record
+        name = record.name.value
+        with self.shared() as changed:
+            if name in changed:
+                raise ConflictError(f"Contact {name} was just added in another session.")
+            self.data[name] = record
+            record.book = self
+            self.record_changed(record)
+
+    # Add many contacts at once, e.g. from an import: a contact already in the book gets
+    # the new phones and the fields that are set. All of them go to the journal in one
+    # write and the indexes are updated in one pass. Returns the names of the contacts.
+    def merge_records(self, records):
+        with self.shared():
+            merged = {}
+            for record in records:
+                name = record.name.value
+                current = self.data.get(name)
+                if current is None:
+                    self.data[name] = current = record
+                    record.book = self
+                else:
+                    current.merge(record)
+                current.version += 1
+                merged[name] = current
+            # Without a journal the states would not be written anywhere
+            if self.journal is None:
+                self._log_many("put", dict.fromkeys(merged))
+            else:
+                self._log_many("put", {name: record.serialize() for name, record in merged.items()})
+        return list(merged)
 
     # Find a contact by name at the address book
     def find(self, name):
         return self.data.get(name)
 
+    # Names starting with the prefix, ignoring case, in alphabetical order
+    def names_starting_with(self, prefix, limit=None):
+        return list(self._index("name").starting_with(prefix, limit))
+
+    # Names closest to a possibly misspelled one, best match first
+    def find_similar(self, name, limit=5):
+        return self._index("similar").similar(name, limit)
+
+    # Find the contacts that have the given phone number, written in any format
+    def find_by_phone(self, phone):
+        return [self.data[name] for name in self._index("phone").lookup(phone_number(phone))]
+
+    # Contacts with a phone containing the digits, in batches as they are found, so a short
+    # query on a large book does not collect every match at once
+    def find_by_phone_part(self, digits, batch_size=50):
+        batch = []
+        for name in self._index("phone_part").containing(normalize_phone(digits)):
+            batch.append(self.data[name])
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    # Find the contacts that have the given email
+    def find_by_email(self, email):
+        return [record for record in self.data.values() if record.email and record.email.value == email]
+
+    # Contacts with an email at the given domain, in name order
+    def find_by_domain(self, domain):
+        return self.query(domain=domain)
+
+    # Contacts whose address contains all the given words (city, street, ...), in name order
+    def find_by_address(self, words):
+        return self.query(address=words)
+
+    # Contacts matching all the given conditions, in name order: the beginning of the name,
+    # a phone, an email domain, a birthday between two dates (day and month count) and
+    # words of the address. The most selective index supplies the candidates, the other
+    # conditions are checked against their indexes, so only the matches are loaded.
+    def query(self, name=None, phone=None, domain=None, birthday=None, address=()):
+        conditions = []
+        if name is not None:
+            names = self._index("name")
+            conditions.append((
+                names.count_starting_with(name),
+                lambda: names.starting_with(name),
+                lambda key: names.has_prefix(key, name),
+            ))
+        if phone is not None:
+            conditions.append(self._lookup_condition("phone", phone_number(phone)))
+        if domain is not None:
+            conditions.append(self._lookup_condition("domain", domain.casefold()))
+        for token in tokenize(" ".join(address)):
+            conditions.append(self._lookup_condition("address", token))
+        if birthday is not None:
+            conditions.append(self._range_condition("birthday", _date_windows(*birthday)))
+        if not conditions:
+            return [self.data[name] for name in sorted(self.data)]
+        return [self.data[name] for name in sorted(intersect(conditions))]
+
     # Delete a contact from the address book by name 
-    def delete_contact(self, name):
-        if name in self.data:
-            del self.data[name]
-        else:
-            raise KeyError(f"Contact {name} not found.")
+    def delete(self, name):
+        with self.shared():
+            if name in self.data:
+                self.data.pop(name).book = None
+                self._log("del", name)
+            else:
+                raise KeyError(f"Contact {name} not found.")
+
+    delete_contact = delete
+
+    # Called by a record after every change
+    def record_changed(self, record):
+        self._commit(record.name.value, record, f"Contact {record.name.value}")
 
-    # Get upcoming birthdays within 7 days
-    def get_upcoming_birthdays(self):
+    # Get upcoming birthdays within the given number of days, soonest first,
+    # from the calendar-ordered birthday index
+    def get_upcoming_birthdays(self, days=7):
         today = dt.datetime.now().date()
+        if self.columnar:
+            upcoming = self._index("columns").upcoming_birthdays(today, days)
+            return [(name, birthday.strftime("%d.%m.%Y")) for name, birthday in upcoming]
+        index = self._index("birthday")
         upcoming_birthdays = []
-        for record in self.data.values():
-            if record.birthday:
-                birthday = record.birthday.value
-                birthday_this_year = birthday.replace(year=today.year)
-                if birthday_this_year < today:
-                    birthday_this_year = birthday.replace(year=today.year + 1)
-                delta = birthday_this_year - today
-                if delta.days < 7:
-                    upcoming_birthdays.append((record.name.value, birthday_this_year.strftime("%d.%m.%Y")))
+        seen = set()
+        for low, high in _birthday_windows(today, days):
+            for _, name in index.range(low, high):
+                birthday_this_year = _next_birthday(self.data[name].birthday.value, today)
+                if name not in seen and (birthday_this_year - today).days < days:
+                    seen.add(name)
+                    upcoming_birthdays.append((name, birthday_this_year.strftime("%d.%m.%Y")))
         return upcoming_birthdays
 
+    # Number of birthdays in every month, January first
+    def birthdays_by_month(self):
+        if self.columnar:
+            return self._index("columns").birthdays_by_month()
+        index = self._index("birthday")
+        return [index.count(month * 100 + 1, month * 100 + 31) for month in range(1, 13)]
+
+    # (domain, number of contacts) for every email domain, most common first
+    def domain_counts(self):
+        if self.columnar:
+            return self._index("columns").domain_counts()
+        postings = self._index("domain").postings
+        return sorted(((domain, len(names)) for domain, names in postings.items()), key=lambda pair: -pair[1])
+
     # Convert address book to PrettyTable format for display
     def to_table(self):
         table = PrettyTable()
-        table.field_names = ["Name", "Phones", "Birthday", "Email"]
+        table.field_names = ["Name", "Phones", "Birthday", "Email", "Address"]
         for record in self.data.values():
             table.add_row(record.to_dict().values())
         return table
 
+# Items of a binary snapshot, decoded the first time they are accessed
+class SnapshotRecords(MutableMapping):
+    def __init__(self, snapshot, book):
+        self.snapshot = snapshot
+        self.book = book
+        self.loaded = {}
+        self.new_keys = {}
+        self.deleted = set()
+        self.size = snapshot.count
+
+    def _in_snapshot(self, key):
+        return self.snapshot.find(self.book.encode_key(key)) >= 0
+
+    def __getitem__(self, key):
+        if key in self.loaded:
+            return self.loaded[key]
+        if key in self.deleted:
+            raise KeyError(key)
+        index = self.snapshot.find(self.book.encode_key(key))
+        if index < 0:
+            raise KeyError(key)
+        item = self.book.decode_item(*self.snapshot.entry(index))
+        self.loaded[key] = item
+        return item
+
+    def __setitem__(self, key, item):
+        if key not in self.loaded and key not in self.new_keys:
+            if key in self.deleted:
+                self.deleted.discard(key)
+                self.size += 1
+            elif not self._in_snapshot(key):
+                self.new_keys[key] = None
+                self.size += 1
+        self.loaded[key] = item
+
+    def __delitem__(self, key):
+        if key in self.new_keys:
+            del self.new_keys[key]
+        elif key in self.deleted or not self._in_snapshot(key):
+            raise KeyError(key)
+        else:
+            self.deleted.add(key)
+        self.loaded.pop(key, None)
+        self.size -= 1
+
+    def __contains__(self, key):
+        if key in self.loaded:
+            return True
+        if key in self.deleted:
+            return False
+        return self._in_snapshot(key)
+
+    def __iter__(self):
+        for index in range(self.snapshot.count):
+            key = self.book.decode_key(self.snapshot.key(index))
+            if key not in self.deleted:
+                yield key
+        yield from list(self.new_keys)
+
+    # A full pass decodes the entries in file order instead of looking up every key
+    def items(self):
+        for index in range(self.snapshot.count):
+            key, payload = self.snapshot.entry(index)
+            decoded = self.book.decode_key(key)
+            if decoded in self.deleted:
+                continue
+            item = self.loaded.get(decoded)
+            if item is None:
+                item = self.loaded[decoded] = self.book._adopt(decoded, self.book.item_class.from_bytes(decoded, payload))
+            yield decoded, item
+        for key in list(self.new_keys):
+            yield key, self.loaded[key]
+
+    def values(self):
+        for _, item in self.items():
+            yield item
+
+    def __len__(self):
+        return self.size
+
+    # Entries for a new snapshot; entries that were never decoded are copied as they are
+    def entries(self):
+        changed = sorted((self.book.encode_key(key), item.to_bytes()) for key, item in self.loaded.items())
+
+        def untouched():
+            for index in range(self.snapshot.count):
+                key, payload = self.snapshot.entry(index)
+                decoded = self.book.decode_key(key)
+                if decoded not in self.loaded and decoded not in self.deleted:
+                    yield key, payload
+
+        return heapq.merge(untouched(), changed, key=lambda entry: entry[0])
+
+
+# Records kept in an SQLite database and turned into Record objects only when accessed
+class SQLiteRecords(MutableMapping):
+    def __init__(self, connection, book):
+        self.connection = connection
+        self.book = book
+        self.cache = {}
+
+    def __getitem__(self, name):
+        if name in self.cache:
+            return self.cache[name]
+        row = self.connection.execute(
+            "SELECT name, birthday, email, address, version FROM contacts WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(name)
+        phones = [p for (p,) in self.connection.execute(
+            "SELECT phone FROM phones WHERE name = ? ORDER BY position", (name,)
+        )]
+        birthday = datetime.strptime(row[1], "%Y-%m-%d").strftime("%d.%m.%Y") if row[1] else None
+        record = Record.deserialize({
+            "name": row[0], "phones": phones, "birthday": birthday, "email": row[2], "address": row[3],
+            "version": row[4],
+        })
+        record.book = self.book
+        self.cache[name] = record
+        return record
+
+    # Changes stay in the open transaction until the book is flushed
+    def __setitem__(self, name, record):
+        birthday = record.birthday.value if record.birthday else None
+        self.connection.execute(
+            "INSERT INTO contacts (name, version, birthday, birthday_md, email, email_domain, address) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET version = excluded.version, birthday = excluded.birthday, "
+            "birthday_md = excluded.birthday_md, email = excluded.email, email_domain = excluded.email_domain, "
+            "address = excluded.address",
+            (
+                name,
+                record.version,
+                birthday.isoformat() if birthday else None,
+                birthday.strftime("%m-%d") if birthday else None,
+                record.email.value if record.email else None,
+                email_domain(record.email.value) if record.email else None,
+                record.address.value if record.address else None,
+            ),
+        )
+        self.connection.execute("DELETE FROM phones WHERE name = ?", (name,))
+        self.connection.executemany(
+            "INSERT INTO phones (name, phone, position, number, forms) VALUES (?, ?, ?, ?, ?)",
+            [(name, p.value, i, p.number, " ".join(phone_search_forms(p))) for i, p in enumerate(record.phones)],
+        )
+        self.connection.execute("DELETE FROM phone_grams WHERE name = ?", (name,))
+        self.connection.executemany(
+            "INSERT INTO phone_grams (name, gram) VALUES (?, ?)",
+            [(name, gram) for gram in _phone_grams(record.phones)],
+        )
+        self.connection.execute("DELETE FROM address_words WHERE name = ?", (name,))
+        self.connection.executemany(
+            "INSERT INTO address_words (name, word) VALUES (?, ?)",
+            [(name, word) for word in set(tokenize(record.address.value))] if record.address else [],
+        )
+        self.cache[name] = record
+
+    def __delitem__(self, name):
+        deleted = self.connection.execute("DELETE FROM contacts WHERE name = ?", (name,)).rowcount
+        self.connection.execute("DELETE FROM phones WHERE name = ?", (name,))
+        self.connection.execute("DELETE FROM phone_grams WHERE name = ?", (name,))
+        self.connection.execute("DELETE FROM address_words WHERE name = ?", (name,))
+        self.cache.pop(name, None)
+        if not deleted:
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        if name in self.cache:
+            return True
+        return self.connection.execute("SELECT 1 FROM contacts WHERE name = ?", (name,)).fetchone() is not None
+
+    def __iter__(self):
+        for (name,) in self.connection.execute("SELECT name FROM contacts ORDER BY rowid").fetchall():
+            yield name
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+
+
+# Pieces of all the search forms of some phones
+def _phone_grams(phones):
+    return {gram for phone in phones for form in phone_search_forms(phone) for gram in ngrams(form, PHONE_GRAM)}
+
+
+# Address book stored in SQLite: nothing is read at startup, lookups go through SQL indexes
+class SQLiteAddressBook(AddressBook):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS contacts (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            birthday TEXT,
+            birthday_md TEXT,
+            email TEXT,
+            email_domain TEXT,
+            address TEXT
+        );
+        CREATE TABLE IF NOT EXISTS phones (
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            number INTEGER,
+            forms TEXT
+        );
+        CREATE TABLE IF NOT EXISTS address_words (
+            name TEXT NOT NULL,
+            word TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS address_words_word ON address_words (word);
+        CREATE INDEX IF NOT EXISTS address_words_name ON address_words (name);
+        CREATE TABLE IF NOT EXISTS phone_grams (
+            name TEXT NOT NULL,
+            gram TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS phone_grams_gram ON phone_grams (gram);
+        CREATE INDEX IF NOT EXISTS phone_grams_name ON phone_grams (name);
+        CREATE INDEX IF NOT EXISTS phones_name ON phones (name);
+        CREATE INDEX IF NOT EXISTS contacts_name_nocase ON contacts (name COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS contacts_email ON contacts (email);
+        CREATE INDEX IF NOT EXISTS contacts_birthday_md ON contacts (birthday_md);
+    """
+
+    def __init__(self, filename):
+        super().__init__()
+        self.filename = filename
+        # Autosave commits from its timer thread, access is serialized by the command lock
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        # Readers in other sessions are not blocked while this one writes
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        tables = {name for (name,) in self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.connection.executescript(self.SCHEMA)
+        phone_columns = [row[1] for row in self.connection.execute("PRAGMA table_info (phones)")]
+        if "number" not in phone_columns:
+            self.connection.execute("ALTER TABLE phones ADD COLUMN number INTEGER")
+            self.connection.execute("ALTER TABLE phones ADD COLUMN forms TEXT")
+            self._index_phone_numbers()
+        elif "phones" in tables and "phone_grams" not in tables:
+            self._index_phone_numbers()
+        self.connection.execute("DROP INDEX IF EXISTS phones_phone")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS phones_number ON phones (number)")
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info (contacts)")]
+        if "version" not in columns:
+            self.connection.execute("ALTER TABLE contacts ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if "email_domain" not in columns:
+            self.connection.execute("ALTER TABLE contacts ADD COLUMN email_domain TEXT")
+            self._index_domains_and_addresses()
+        self.connection.execute("CREATE INDEX IF NOT EXISTS contacts_email_domain ON contacts (email_domain)")
+        self.data_version = None
+        self.data = SQLiteRecords(self.connection, self)
+
+    def __getstate__(self):
+        raise TypeError("SQLite address book is saved in its database, not pickled.")
+
+    # Fill the canonical numbers and their pieces of a database created before they were kept
+    def _index_phone_numbers(self):
+        rows = self.connection.execute("SELECT rowid, name, phone FROM phones").fetchall()
+        phones = [(rowid, name, _restore_phone(value)) for rowid, name, value in rows]
+        self.connection.executemany(
+            "UPDATE phones SET number = ?, forms = ? WHERE rowid = ?",
+            [(phone.number, " ".join(phone_search_forms(phone)), rowid) for rowid, _, phone in phones],
+        )
+        self.connection.execute("DELETE FROM phone_grams")
+        self.connection.executemany(
+            "INSERT INTO phone_grams (name, gram) VALUES (?, ?)",
+            {(name, gram) for _, name, phone in phones for gram in _phone_grams([phone])},
+        )
+        self.connection.commit()
+
+    # Fill the email domains and address words of a database created before they were kept
+    def _index_domains_and_addresses(self):
+        rows = self.connection.execute("SELECT name, email, address FROM contacts").fetchall()
+        for name, email, address in rows:
+            self.connection.execute(
+                "UPDATE contacts SET email_domain = ? WHERE name = ?", (email_domain(email) if email else None, name)
+            )
+            self.connection.executemany(
+                "INSERT INTO address_words (name, word) VALUES (?, ?)",
+                [(name, word) for word in set(tokenize(address or ""))],
+            )
+        self.connection.commit()
+
+    def add_record(self, record):
+        name = record.name.value
+        known = self.data.cache.get(name)
+        if known is None and name in self.data:
+            raise ConflictError(f"Contact {name} was just added in another session.")
+        record.version = known.version if known else 0
+        record.book = self
+        self.record_changed(record)
+
+    def delete(self, name):
+        try:
+            del self.data[name]
+        except KeyError:
+            raise KeyError(f"Contact {name} not found.")
+        except sqlite3.OperationalError:
+            raise ConflictError("The address book is busy in another session, please try again.")
+        self._item_changed(name)
+
+    delete_contact = delete
+
+    # Contacts of an import go to the open transaction one by one and are committed together
+    def merge_records(self, records):
+        merged = {}
+        for record in records:
+            name = record.name.value
+            current = merged.get(name) or self.data.get(name)
+            if current is None:
+                current = record
+                record.book = self
+            else:
+                current.merge(record)
+            current.version += 1
+            try:
+                self.data[name] = current
+            except sqlite3.OperationalError:
+                raise ConflictError("The address book is busy in another session, please try again.")
+            merged[name] = current
+        self._items_changed(merged)
+        return list(merged)
+
+    # Every change goes to the database at once and is committed when the command ends;
+    # the stored version tells whether another session changed the contact meanwhile
+    def record_changed(self, record):
+        name = record.name.value
+        row = self.connection.execute("SELECT version FROM contacts WHERE name = ?", (name,)).fetchone()
+        if row is not None and row[0] != record.version:
+            self.data.cache.pop(name, None)
+            raise ConflictError(f"Contact {name} was changed in another session, please try again.")
+        record.version += 1
+        try:
+            self.data[name] = record
+        except sqlite3.OperationalError:
+            record.version -= 1
+            raise ConflictError("The address book is busy in another session, please try again.")
+        self._item_changed(name)
+
+    # Forget cached contacts once another session has committed changes
+    def refresh(self):
+        data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self.data_version:
+            self.data.cache.clear()
+            self.data_version = data_version
+
+    def commit(self):
+        self.connection.commit()
+        self.dirty.clear()
+
+    # Commit after every command, an open write transaction would lock the other sessions out
+    def command_done(self):
+        if self.dirty:
+            self.commit()
+
+    # Range scan on the case-insensitive name index (case is folded for ASCII letters only)
+    def names_starting_with(self, prefix, limit=None):
+        rows = self.connection.execute(
+            "SELECT name FROM contacts WHERE name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE "
+            "ORDER BY name COLLATE NOCASE LIMIT ?",
+            (prefix, prefix + chr(0x10FFFF), -1 if limit is None else limit),
+        ).fetchall()
+        return [name for (name,) in rows]
+
+    def find_by_phone(self, phone):
+        rows = self.connection.execute(
+            "SELECT DISTINCT name FROM phones WHERE number = ?", (phone_number(phone),)
+        ).fetchall()
+        return [self.data[name] for (name,) in rows]
+
+    def find_by_email(self, email):
+        rows = self.connection.execute("SELECT name FROM contacts WHERE email = ?", (email,)).fetchall()
+        return [self.data[name] for (name,) in rows]
+
+    # Candidates come from the contacts having every piece of the digits, rows are fetched batch by batch
+    def find_by_phone_part(self, digits, batch_size=50):
+        digits = normalize_phone(digits)
+        grams = sorted(ngrams(digits, PHONE_GRAM))
+        if grams:
+            candidates = " INTERSECT ".join(["SELECT name FROM phone_grams WHERE gram = ?"] * len(grams))
+            sql = f"SELECT DISTINCT name FROM phones WHERE name IN ({candidates}) AND instr(forms, ?) > 0"
+        else:
+            sql = "SELECT DISTINCT name FROM phones WHERE instr(forms, ?) > 0"
+        cursor = self.connection.execute(sql, grams + [digits])
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [self.data[name] for (name,) in rows]
+
+    # The conditions become one statement and SQLite picks the index to use
+    def query(self, name=None, phone=None, domain=None, birthday=None, address=()):
+        clauses = []
+        params = []
+        if name is not None:
+            clauses.append("name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE")
+            params += [name, name + chr(0x10FFFF)]
+        if phone is not None:
+            clauses.append("name IN (SELECT name FROM phones WHERE number = ?)")
+            params.append(phone_number(phone))
+        if domain is not None:
+            clauses.append("email_domain = ?")
+            params.append(domain.casefold())
+        for token in tokenize(" ".join(address)):
+            clauses.append("name IN (SELECT name FROM address_words WHERE word = ?)")
+            params.append(token)
+        if birthday is not None:
+            windows = _date_windows(*birthday)
+            clauses.append("(" + " OR ".join(["birthday_md BETWEEN ? AND ?"] * len(windows)) + ")")
+            for low, high in windows:
+                params += [f"{low // 100:02d}-{low % 100:02d}", f"{high // 100:02d}-{high % 100:02d}"]
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        rows = self.connection.execute(f"SELECT name FROM contacts{where} ORDER BY name", params).fetchall()
+        return [self.data[name] for (name,) in rows]
+
+    def birthdays_by_month(self):
+        counts = dict(self.connection.execute(
+            "SELECT CAST(substr(birthday_md, 1, 2) AS INTEGER), COUNT(*) FROM contacts "
+            "WHERE birthday_md IS NOT NULL GROUP BY 1"
+        ).fetchall())
+        return [counts.get(month, 0) for month in range(1, 13)]
+
+    def domain_counts(self):
+        return self.connection.execute(
+            "SELECT email_domain, COUNT(*) FROM contacts WHERE email_domain IS NOT NULL "
+            "GROUP BY email_domain ORDER BY COUNT(*) DESC"
+        ).fetchall()
+
+    # Only the contacts whose birthday falls within the window are read
+    def get_upcoming_birthdays(self, days=7):
+        today = dt.datetime.now().date()
+        upcoming_birthdays = []
+        seen = set()
+        for low, high in _birthday_windows(today, days):
+            rows = self.connection.execute(
+                "SELECT name, birthday FROM contacts WHERE birthday_md BETWEEN ? AND ? ORDER BY birthday_md",
+                (f"{low // 100:02d}-{low % 100:02d}", f"{high // 100:02d}-{high % 100:02d}"),
+            ).fetchall()
+            for name, birthday in rows:
+                birthday_this_year = _next_birthday(datetime.strptime(birthday, "%Y-%m-%d").date(), today)
+                if name not in seen and (birthday_this_year - today).days < days:
+                    seen.add(name)
+                    upcoming_birthdays.append((name, birthday_this_year.strftime("%d.%m.%Y")))
+        return upcoming_birthdays
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
 # Function to parse user input and separate command from arguments
 def parse_input(user_input):
     if not user_input.strip():
@@ -225,6 +1328,30 @@ def parse_input(user_input):
     except ValueError:
         return None, []
 
+
+# Arguments of a command that starts with a contact name. A name with spaces, such as an
+# imported one, is written in double quotes: phone "Dora Smith".
+def parse_name_args(user_input):
+    lexer = shlex.shlex(user_input, posix=True)
+    lexer.whitespace_split = True
+    lexer.quotes = '"'
+    lexer.escape = ""
+    lexer.commenters = ""
+    try:
+        return list(lexer)[1:]
+    except ValueError:
+        # An unpaired quote is taken as it is
+        return user_input.split()[1:]
+
+
+# Message for a contact that does not exist, with the closest names as a hint
+def contact_not_found(book, name):
+    similar = book.find_similar(name, 3)
+    if similar:
+        return f"Contact {name} not found. Did you mean: {', '.join(similar)}?"
+    return f"Contact {name} not found."
+
+
 # Decorator for error handling
 def input_error(func):
     def inner(*args, **kwargs):
@@ -249,7 +1376,7 @@ def add_contact(args, book):
         raise ValueError("Give me name and phone please.")
     name, phone = args[0], args[1]
     if not Phone.is_valid_phone(phone):
-        raise ValueError("Invalid phone number format. It should be 10 digits.")
+        raise ValueError(PHONE_FORMAT_ERROR)
     record = book.find(name)
     if record:
         record.add_phone(phone)
@@ -268,7 +1395,7 @@ def change_contact(args, book):
     name, old_phone, new_phone = args[0], args[1], args[2]
     record = book.find(name)
     if not record:
-        raise KeyError(f"Contact {name} not found.")
+        raise KeyError(contact_not_found(book, name))
     record.edit_phone(old_phone, new_phone)
     return "Contact updated."
 
@@ -281,14 +1408,142 @@ def get_contact(args, book):
     name = args[0]
     record = book.find(name)
     if not record:
-        raise KeyError(f"Contact {name} not found.")
+        raise KeyError(contact_not_found(book, name))
     
     table = PrettyTable()
-    table.field_names = ["Name", "Phones", "Birthday"]
+    table.field_names = ["Name", "Phones", "Birthday", "Email", "Address"]
     table.add_row(record.to_dict().values())
     return table
 
 
+# Find contacts whose name starts with the given letters
+@input_error
+def find_contacts(args, book):
+    if len(args) < 1:
+        raise ValueError("Give me the beginning of a name please.")
+    prefix = args[0]
+    names = book.names_starting_with(prefix)
+    if not names:
+        return f"No contacts starting with {prefix}."
+    table = PrettyTable()
+    table.field_names = ["Name", "Phones", "Birthday", "Email", "Address"]
+    for name in names:
+        table.add_row(book.find(name).to_dict().values())
+    return table
+
+
+# Find out whose phone number it is
+@input_error
+def who_is(args, book):
+    if len(args) < 1:
+        raise ValueError("Give me phone please.")
+    phone = args[0]
+    records = book.find_by_phone(phone)
+    if not records:
+        return f"No contact has phone {phone}."
+    table = PrettyTable()
+    table.field_names = ["Name", "Phones", "Birthday", "Email", "Address"]
+    for record in records:
+        table.add_row(record.to_dict().values())
+    return table
+
+
+# List contacts with an email at the given domain
+@input_error
+def contacts_by_domain(args, book):
+    if len(args) < 1:
+        raise ValueError("Give me an email domain please.")
+    domain = args[0].lstrip("@")
+    records = book.find_by_domain(domain)
+    if not records:
+        return f"No contacts with email at {domain}."
+    table = PrettyTable()
+    table.field_names = ["Name", "Phones", "Birthday", "Email", "Address"]
+    for record in records:
+        table.add_row(record.to_dict().values())
+    return table
+
+
+# List contacts whose address contains the given words
+@input_error
+def contacts_by_address(args, book):
+    if len(args) < 1:
+        raise ValueError("Give me a city, street or other part of an address please.")
+    records = book.find_by_address(args)
+    if not records:
+        return f"No contacts live at {' '.join(args)}."
+    table = PrettyTable()
+    table.field_names = ["Name", "Phones", "Birthday", "Email", "Address"]
+    for record in records:
+        table.add_row(record.to_dict().values())
+    return table
+
+
+# Conditions understood by the query command
+QUERY_FIELDS = ("name", "phone", "domain", "birthday", "address")
+
+
+# Day and month written as DD.MM, the year does not matter
+def _parse_day_month(value):
+    try:
+        # A leap year so that 29.02 is accepted
+        return datetime.strptime(f"{value}.2000", "%d.%m.%Y").date()
+    except ValueError:
+        raise ValueError("Invalid date format. Use DD.MM-DD.MM")
+
+
+# Find contacts matching several conditions at once, e.g. name=Ol domain=gmail.com birthday=01.03-31.03
+@input_error
+def query_contacts(args, book):
+    if len(args) < 1:
+        raise ValueError(f"Give me conditions please: {', '.join(f'{field}=...' for field in QUERY_FIELDS)}")
+    criteria = {"address": []}
+    for arg in args:
+        field, _, value = arg.partition("=")
+        field = field.lower()
+        if field not in QUERY_FIELDS or not value:
+            raise ValueError(f"Unknown condition {arg}. Use {', '.join(f'{field}=...' for field in QUERY_FIELDS)}")
+        if field == "address":
+            criteria["address"].append(value)
+        elif field == "birthday":
+            start, _, end = value.partition("-")
+            criteria["birthday"] = (_parse_day_month(start), _parse_day_month(end or start))
+        else:
+            criteria[field] = value
+    records = book.query(**criteria)
+    if not records:
+        return "No contacts match."
+    table = PrettyTable()
+    table.field_names = ["Name", "Phones", "Birthday", "Email", "Address"]
+    for record in records:
+        table.add_row(record.to_dict().values())
+    return table
+
+
+# Matches shown at once by phone-part unless a number is given
+PHONE_PART_LIMIT = 20
+
+
+# Find contacts by a part of a phone number, e.g. its last digits
+@input_error
+def find_by_phone_part(args, book):
+    if len(args) < 1 or not normalize_phone(args[0]):
+        raise ValueError("Give me some digits of the phone please.")
+    digits = args[0]
+    limit = int(args[1]) if len(args) > 1 and args[1].isdigit() else PHONE_PART_LIMIT
+    batches = book.find_by_phone_part(digits, limit)
+    records = next(batches, [])
+    if not records:
+        return f"No phone contains {digits}."
+    table = PrettyTable()
+    table.field_names = ["Name", "Phones", "Birthday", "Email", "Address"]
+    for record in records:
+        table.add_row(record.to_dict().values())
+    if next(batches, None) is not None:
+        return f"{table}\nShowing the first {limit} matches, ask for more with phone-part {digits} <number>."
+    return table
+
+
 # Delete a contact by name
 @input_error
 def delete_contact(args, book):
@@ -305,13 +1560,10 @@ def add_birthday(args, book):
     if len(args) < 2:
         raise ValueError("Give me name and birthday please.")
     name, birthday = args[0], args[1]
-    try:
-        datetime.strptime(birthday, "%d.%m.%Y")
-    except ValueError:
-        raise ValueError("Invalid date format. Use DD.MM.YYYY.")
-    record = book.find_contact(name)
+    parse_birthday(birthday)
+    record = book.find(name)
     if not record:
-        raise KeyError(f"Contact {name} not found.")
+        raise KeyError(contact_not_found(book, name))
     record.add_birthday(birthday)
     return "Birthday added."
 
@@ -325,6 +1577,37 @@ def all_contacts(book):
     
 
 
+# Show contacts with birthdays in the next days, 7 unless given
+@input_error
+def upcoming_birthdays(args, book):
+    if args and not args[0].isdigit():
+        raise ValueError("Give me number of days please.")
+    days = int(args[0]) if args else 7
+    if days < 1:
+        raise ValueError("Number of days must be positive.")
+    birthdays = book.get_upcoming_birthdays(days)
+    if not birthdays:
+        return f"No upcoming birthdays in the next {days} days."
+    table = PrettyTable()
+    table.field_names = ["Name", "Birthday"]
+    for name, birthday in birthdays:
+        table.add_row([name, birthday])
+    return f"Upcoming birthdays in the next {days} days:\n{table}"
+
+
+# Show how many birthdays fall in each month
+@input_error
+def birthday_stats(args, book):
+    counts = book.birthdays_by_month()
+    if not any(counts):
+        return "No birthdays saved yet."
+    table = PrettyTable()
+    table.field_names = ["Month", "Birthdays"]
+    for month, count in enumerate(counts, 1):
+        table.add_row([calendar.month_name[month], count])
+    return table
+
+
 # Show birthday by name
 @input_error
 def show_birthday(args, book):
@@ -333,26 +1616,288 @@ def show_birthday(args, book):
     name = args[0]
     record = book.find(name)
     if not record:
-        raise KeyError(f"Contact {name} not found.")
+        raise KeyError(contact_not_found(book, name))
     if record.birthday:
         return f"{name}'s birthday is on {record.birthday}"
     else:
         return f"No birthday set for {name}."
 
 
+# Contacts per chunk of an import file and rejected rows listed after an import
+IMPORT_CHUNK_SIZE = 10000
+REJECT_LIMIT = 20
+
+
+# Parse and validate one chunk of an import file, run in a worker process. The valid
+# contacts come back as tuples of their checked values, cheaper to send between processes
+# than records, the rejected rows as (row, field, message) numbered from 1 in the file.
+def _import_chunk(kind, header, first, lines):
+    columns = parse_vcards(lines) if kind == "vcard" else parse_csv(header, lines)
+    rows, checked, errors = validate_columns(columns)
+    phones = columns.get("phones")
+    missing = [None] * len(rows)
+    contacts = zip(
+        checked["name"],
+        ([list(zip(phones[row], numbers or ())) for row, numbers in zip(rows, checked["phones"])] if phones else missing),
+        checked.get("birthday", missing),
+        checked.get("email", missing),
+        checked.get("address", missing),
+    )
+    return list(contacts), [(first + row + 1, field, message) for row, field, message in errors]
+
+
+# Record of an imported contact from the values _import_chunk() checked
+def _imported_record(name, phones, birthday, email, address):
+    record = Record.__new__(Record)
+    record.name = _restore_field(Name, name)
+    record.phones = [_restore_phone(value, number) for value, number in phones or ()]
+    record.birthday = _restore_field(Birthday, birthday) if birthday is not None else None
+    record.email = _restore_field(Email, email) if email is not None else None
+    record.address = _restore_field(Address, address) if address is not None else None
+    record.version = 0
+    record.book = None
+    return record
+
+
+# Import the contacts of a CSV file, whose header names the name, phone, email, birthday and
+# address columns, or of a vCard (.vcf) file. The file is read in chunks that worker
+# processes parse and validate while the book takes in the chunks before them;
+# progress(imported, rejected) is called after every chunk. Returns the number of
+# contacts imported and the rejected rows as (row, field, message).
+def import_contacts(book, filename, workers=None, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    kind = file_kind(filename)
+    workers = workers or os.cpu_count() or 1
+    imported = 0
+    rejected = []
+    with open(filename, encoding="utf-8-sig", newline="") as lines:
+        header = None
+        if kind == "csv":
+            header = csv_header(next(lines, ""))
+            if "name" not in header:
+                raise ValueError(f"{filename} has no name column.")
+        chunks = ((kind, header, first, chunk) for first, chunk in read_chunks(lines, kind, chunk_size))
+        with ProcessPoolExecutor(workers) if workers > 1 else nullcontext() as pool:
+            results = bounded_map(pool, _import_chunk, chunks, 2 * workers) if pool else starmap(_import_chunk, chunks)
+            for contacts, errors in results:
+                imported += len(book.merge_records([_imported_record(*contact) for contact in contacts]))
+                rejected.extend(errors)
+                if progress is not None:
+                    progress(imported, len(rejected))
+    return imported, rejected
+
+
+def _show_import_progress(imported, rejected):
+    print(f"\r{imported} contacts imported, {rejected} rows rejected...", end="", flush=True)
+
+
+# Import contacts from a CSV or vCard file
+@input_error
+def import_file(args, book):
+    if len(args) < 1:
+        raise ValueError("Give me the file to import please.")
+    filename = " ".join(args)
+    try:
+        imported, rejected = import_contacts(book, filename, progress=_show_import_progress)
+    except OSError as e:
+        raise ValueError(f"Cannot read {filename}: {e.strerror}.")
+    print()
+    lines = [f"{imported} contacts imported, {len(rejected)} rows rejected."]
+    lines.extend(f"Row {row}, {field}: {message}" for row, field, message in rejected[:REJECT_LIMIT])
+    if len(rejected) > REJECT_LIMIT:
+        lines.append(f"...and {len(rejected) - REJECT_LIMIT} more.")
+    return "\n".join(lines)
+
+
+# Unpickler that maps classes pickled by older versions of the assistant onto the current ones
+class _Unpickler(pickle.Unpickler):
+    LEGACY_MODULES = ("__main__", "jozef", "notes", "vorobiovk", "Oldiest")
+    CLASSES = ("AddressBook", "Record", "Name", "Phone", "Email", "Address", "Birthday", "NoteBook", "Note", "Tag")
+
+    def find_class(self, module, name):
+        if module in self.LEGACY_MODULES and name in self.CLASSES:
+            return globals()[name]
+        return super().find_class(module, name)
+
+
+# Files with this extension hold a binary snapshot instead of a pickle
+BINARY_EXTENSION = ".jzf"
+
+
+# Open a binary snapshot without decoding any of its entries
+def _load_binary(filename, book_class):
+    try:
+        snapshot = SnapshotFile(filename)
+    except FileNotFoundError:
+        return book_class()
+    if snapshot.kind != book_class.snapshot_kind:
+        raise ValueError(f"{filename} does not hold a {book_class.__name__}.")
+    book = book_class()
+    book.journal_seq = snapshot.journal_seq
+    if isinstance(book, NoteBook):
+        book.next_id = max(snapshot.next_id, 1)
+    book.data = SnapshotRecords(snapshot, book)
+    return book
+
+
+# Load a pickled snapshot, falling back to an empty book
+def _load_snapshot(filename, default):
+    if filename.endswith(BINARY_EXTENSION):
+        return _load_binary(filename, default)
+    try:
+        with open(filename, "rb") as f:
+            return _Unpickler(f).load()
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return default()
+
+
+# Snapshot contents in the format chosen by the file extension
+def _serialize(book, filename):
+    if filename.endswith(BINARY_EXTENSION):
+        return encode_snapshot(book.snapshot_kind, book.snapshot_entries(), book.journal_seq, getattr(book, "next_id", 0))
+    return pickle.dumps(book)
+
+
+# Replay the journal on top of the snapshot and keep following it for changes made by
+# other sessions; the journal is shared by every process that opens the same file
+def _load_journaled(filename, book_class):
+    lock = FileLock(f"{filename}.lock")
+    snapshot_lock = FileLock(f"{filename}.snapshot.lock")
+    # A background save replaces the snapshot and then drops the rotated journal holding
+    # only the snapshot lock, so the snapshot and the journal are read under it as well
+    with lock, snapshot_lock:
+        book = _load_snapshot(filename, book_class)
+        journal = Journal(f"{filename}.journal")
+        for entry in journal.read():
+            book.apply_entry(entry)
+    book.journal = journal
+    book.lock = lock
+    book.snapshot_lock = snapshot_lock
+    book.filename = filename
+    return book
+
+
+# Write a full snapshot; the journal is emptied once the snapshot is on disk
+def _save_snapshot(book, filename):
+    if book.background_save is not None:
+        book.background_save.poll(wait=True)
+    with book.shared():
+        if book.snapshot_lock is not None:
+            book.snapshot_lock.acquire()
+        try:
+            atomic_write(filename, _serialize(book, filename))
+            if book.journal is not None:
+                book.journal.reset()
+        finally:
+            if book.snapshot_lock is not None:
+                book.snapshot_lock.release()
+    book.dirty.clear()
+
+
+# Start writing a snapshot in the background, the command loop keeps running meanwhile
+def save_in_background(book, filename=None):
+    if isinstance(book, SQLiteAddressBook):
+        book.commit()
+        return
+    if book.background_save is not None and not book.background_save.poll():
+        raise ValueError("Background save is already in progress.")
+    filename = filename or book.filename
+    with book.shared():
+        try:
+            book.background_save = BackgroundSave(
+                filename, lambda: _serialize(book, filename), book.journal, book.snapshot_lock
+            )
+        except BlockingIOError:
+            raise ValueError("Another session is saving this book, please try again later.")
+    book.dirty.clear()
+
+
+# Journal size from which a book is compacted into a new snapshot
+COMPACT_JOURNAL_SIZE = 8 * 2**20
+
+
+# Write out the changes collected since the last flush, False when a save is still running.
+# Changes of a journaled book are already on disk, so its snapshot is only rewritten once
+# the journal has grown large, as on exit.
+def flush_book(book):
+    if not book.dirty:
+        return True
+    if book.journal is not None and book.journal.size() < COMPACT_JOURNAL_SIZE:
+        return True
+    try:
+        save_in_background(book)
+    except ValueError:
+        return False
+    return True
+
+
+# Leave a book on exit. Its changes are already in the journal, which is replayed on the
+# next start, so the snapshot is only rewritten, in the background, once the journal has
+# grown large; a book without changes is not written at all.
+def close_book(book):
+    if isinstance(book, SQLiteAddressBook):
+        book.commit()
+        return
+    if book.journal is None:
+        if book.dirty:
+            _save_snapshot(book, book.filename)
+        return
+    if book.dirty and book.journal.size() >= COMPACT_JOURNAL_SIZE:
+        try:
+            save_in_background(book)
+        except ValueError:
+            # Another save is running, the journal keeps the changes meanwhile
+            pass
+    # Without fork the save runs in a thread that would end with the program
+    if book.background_save is not None and book.background_save.thread is not None:
+        book.background_save.poll(wait=True)
+    book.journal.close()
+
+
+# Save the book automatically once changes settle down
+def enable_autosave(book, idle_seconds, max_changes, lock):
+    book.autosave = AutoSaver(lambda: flush_book(book), idle_seconds, max_changes, lock)
+    return book.autosave
+
+
+# Save both books in the background
+@input_error
+def save_all(book, notebook):
+    save_in_background(book)
+    save_in_background(notebook)
+    return "Background saving started."
+
+
+# Convert a saved book to another format, e.g. an old addressbook.pkl into a binary snapshot
+def convert_data(source, target):
+    if source.endswith(BINARY_EXTENSION):
+        kind = SnapshotFile(source).kind
+        book = _load_binary(source, AddressBook if kind == AddressBook.snapshot_kind else NoteBook)
+    else:
+        with open(source, "rb") as f:
+            book = _Unpickler(f).load()
+    for entry in Journal(f"{source}.journal").read():
+        book.apply_entry(entry)
+    atomic_write(target, _serialize(book, target))
+    return f"{len(book)} entries converted from {source} to {target}."
+
+
+# Address book files with these extensions are kept in SQLite instead of a pickle
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
 # Function to save the address book to a file
 def save_data(book, filename="addressbook.pkl"):
-    with open(filename, "wb") as f:
-        pickle.dump(book, f)
+    if isinstance(book, SQLiteAddressBook):
+        book.commit()
+        return
+    _save_snapshot(book, filename)
 
 
 # Function to load the address book from a file
 def load_data(filename="addressbook.pkl"):
-    try:
-        with open(filename, "rb") as f:
-            return pickle.load(f)
-    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
-        return AddressBook()
+    if filename.endswith(SQLITE_EXTENSIONS):
+        return SQLiteAddressBook(filename)
+    return _load_journaled(filename, AddressBook)
 
 
 COMMANDS = [
@@ -360,6 +1905,12 @@ COMMANDS = [
     "add",
     "change",
     "phone",
+    "find",
+    "who",
+    "phone-part",
+    "query",
+    "by-domain",
+    "by-address",
     "add-email",
     "change-email",
     "delete-email",
@@ -372,25 +1923,99 @@ COMMANDS = [
     "delete",
     "add-birthday",
     "birthdays",
+    "birthday-stats",
     "show-birthday",
+    "import",
     "add-note",
     "delete-note",
     "add-tag",
     "delete-tag",
     "find-tag",
+    "search-notes",
     "show-notes",
+    "notes-between",
+    "latest-notes",
+    "save",
     "exit",
     "close",
 ]
 
 
-# Function to handle tab completion for commands
-def completer(text, state):
-    options = [cmd for cmd in COMMANDS if cmd.startswith(text)]
-    if state < len(options):
-        return options[state]
-    else:
-        return None
+# Other words accepted for commands, more can be given with --alias
+ALIASES = {
+    "help": "hello",
+    "list": "all",
+    "quit": "exit",
+    "notes": "show-notes",
+}
+
+# Commands that are only suggested, never run on a guess
+NO_GUESS_COMMANDS = {"delete", "delete-email", "delete-address", "delete-note", "delete-tag", "exit", "close"}
+
+
+# Turns what the user typed into a command. Commands and aliases go into a BK-tree once at
+# start; an unknown word is looked up there and the answer is remembered, so a script that
+# repeats the same typo thousands of times pays for the search once.
+class CommandResolver:
+    def __init__(self, commands, aliases):
+        self.commands = set(commands)
+        self.aliases = dict(aliases)
+        self.tree = BKTree(keyboard_distance, sorted(self.commands | set(self.aliases)))
+        self.known = {}
+
+    # The command to run (or None) and the closest commands when it had to be guessed
+    def resolve(self, word):
+        if word in self.commands:
+            return word, []
+        if word in self.aliases:
+            return self.aliases[word], []
+        if word not in self.known:
+            self.known[word] = self._guess(word)
+        return self.known[word]
+
+    def _guess(self, word):
+        # One slip for short words, two for longer ones
+        max_distance = 1 if len(word) < 6 else 2
+        suggestions = []
+        for distance, match in self.tree.search(word, max_distance):
+            command = self.aliases.get(match, match)
+            if command not in suggestions:
+                suggestions.append(command)
+        matches = self.tree.search(word, 0.5)
+        # Run it only when a single command is one neighbouring key away
+        if len(matches) == 1:
+            command = self.aliases.get(matches[0][1], matches[0][1])
+            if command not in NO_GUESS_COMMANDS:
+                return command, [command]
+        return None, suggestions[:3]
+
+
+# Commands whose first argument is a contact name
+NAME_COMMANDS = {
+    "add", "change", "phone", "add-email", "change-email", "delete-email", "get-email", "add-address",
+    "change-address", "delete-address", "get-address", "delete", "add-birthday", "show-birthday",
+}
+
+# Contact names offered by tab completion at once
+COMPLETION_LIMIT = 50
+
+
+# Tab completion for commands and, after a command that takes one, for contact names
+def make_completer(book):
+    options = []
+
+    def complete(text, state):
+        if state == 0:
+            words = readline.get_line_buffer()[:readline.get_begidx()].split()
+            if not words:
+                options[:] = [cmd for cmd in COMMANDS if cmd.startswith(text)]
+            elif len(words) == 1 and words[0].lower() in NAME_COMMANDS:
+                options[:] = book.names_starting_with(text, COMPLETION_LIMIT)
+            else:
+                options[:] = []
+        return options[state] if state < len(options) else None
+
+    return complete
 
 # Function to display available commands in a table format
 def display_commands():
@@ -401,6 +2026,12 @@ def display_commands():
         ["add", "Add a new contact"],
         ["change", "Change an existing contact's phone number"],
         ["phone", "Show a contact's phone number"],
+        ["find", "Find contacts whose name starts with the given letters"],
+        ["who", "Find whose phone number it is"],
+        ["phone-part", "Find contacts by a part of a phone number"],
+        ["by-domain", "List contacts with an email at a domain"],
+        ["by-address", "List contacts whose address has the given words"],
+        ["query", "Find contacts by name=, phone=, domain=, birthday=DD.MM-DD.MM and address= at once"],
         ["add-email", "Add an email to a contact"],
         ["change-email", "Change a contact's email"],
         ["delete-email", "Delete a contact's email"],
@@ -412,44 +2043,182 @@ def display_commands():
         ["all", "Show all contacts"],
         ["delete", "Delete a contact"],
         ["add-birthday", "Add a birthday to a contact"],
-        ["birthdays", "Show upcoming birthdays"],
+        ["birthdays", "Show upcoming birthdays, optionally within N days"],
+        ["birthday-stats", "Show how many birthdays fall in each month"],
         ["show-birthday", "Show a contact's birthday"],
+        ["import", "Import contacts from a CSV or vCard (.vcf) file"],
         ["add-note", "Add a new note"],
         ["delete-note", "Delete a note"],
         ["add-tag", "Add a tag to a note"],
         ["delete-tag", "Delete a tag from a note"],
-        ["find-tag", "Find notes by tag"],
-        ["show-notes", "Show all notes"],
+        ["find-tag", "Find notes by tag, tags can be combined with AND, OR, NOT and end in *"],
+        ["search-notes", "Search notes by text, \"phrases\" and prefixes*"],
+        ["show-notes", "Show all notes, --sort tags, date or id to order them"],
+        ["notes-between", "Show notes created between two dates, add modified for changed ones"],
+        ["latest-notes", "Show the newest notes, 10 unless a number is given"],
+        ["save", "Save contacts and notes in the background"],
         ["exit/close", "Exit the program"],
     ])
     print(table)
 
 # Class for Tag field validation
 class Tag(Field):
-    pass
+    __slots__ = ()
+
+    # Tags repeat across notes, equal tags share one string
+    def __init__(self, value):
+        super().__init__(sys.intern(value))
+
+    def __setstate__(self, state):
+        self.value = sys.intern(state["value"])
+
+
+# Dictionary of tag strings shared by all notes: a note keeps the small integer codes of its
+# tags, so every tag string is stored once and tags are compared as integers. Codes are
+# never written to files, so one dictionary for the whole process serves every notebook.
+class TagDictionary:
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+
+    # Code of the tag, a new one for a tag not seen before
+    def code(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(sys.intern(name))
+        return code
+
+
+TAG_DICTIONARY = TagDictionary()
+
+
+# Notes ordered by the codes of their tags, so notes with the same tags come together.
+# Codes only hold in this process, dumps store the tags as strings.
+class TagOrder(SortedIndex):
+    def __init__(self):
+        super().__init__(lambda note: tuple(sorted(note.tag_codes)))
+
+    def dump(self):
+        names = TAG_DICTIONARY.names
+        return [(tuple(names[code] for code in codes), note_id) for codes, note_id in self.entries]
+
+    def load(self, entries):
+        super().load(sorted(
+            (tuple(sorted(TAG_DICTIONARY.code(name) for name in names)), note_id) for names, note_id in entries
+        ))
+
+
+# Version and number of tags at the start of a binary note
+_NOTE_HEADER = struct.Struct("<IH")
+
 
 # Class to represent a note
 class Note:
+    __slots__ = ("text", "tag_codes", "creation_date", "modification_date", "id", "version", "book")
+
     def __init__(self, text):
         self.text = text
-        self.tags = []
+        self.tag_codes = ()
         self.creation_date = datetime.now()
+        self.modification_date = self.creation_date
+        self.id = None
+        self.version = 0
+        self.book = None
+
+    # Tags as Tag fields, a tuple since changing it would not change the note; assigning
+    # accepts Tag fields or strings
+    @property
+    def tags(self):
+        return tuple(Tag(name) for name in self.tag_names)
+
+    @tags.setter
+    def tags(self, tags):
+        self.tag_codes = tuple(TAG_DICTIONARY.code(t.value if isinstance(t, Tag) else t) for t in tags)
+
+    @property
+    def tag_names(self):
+        names = TAG_DICTIONARY.names
+        return [names[code] for code in self.tag_codes]
+
+    # The owning notebook is not part of the pickled note, tags are pickled as Tag fields
+    # the way they always were, the codes are only valid in this process
+    def __getstate__(self):
+        state = {slot: getattr(self, slot) for slot in self.__slots__ if slot not in ("book", "tag_codes")}
+        state["tags"] = self.tags
+        return state
+
+    # Notes pickled by older versions may lack some of the fields
+    def __setstate__(self, state):
+        state = {"id": None, "version": 0, "modification_date": state["creation_date"], **state}
+        for slot, value in state.items():
+            if slot in self.__slots__:
+                setattr(self, slot, value)
+        self.tags = state.get("tags", ())
+        self.book = None
+
+    # Let the owning notebook know the note has been modified
+    def _changed(self):
+        self.modification_date = datetime.now()
+        if self.book is not None:
+            self.book.note_changed(self)
+
+    # Compact representation of the note used by the journal
+    def serialize(self):
+        return {
+            "text": self.text,
+            "tags": self.tag_names,
+            "creation_date": self.creation_date.isoformat(),
+            "modification_date": self.modification_date.isoformat(),
+            "version": self.version,
+        }
+
+    # Rebuild a note from serialize() output
+    @classmethod
+    def deserialize(cls, state):
+        note = cls(state["text"])
+        note.tags = state["tags"]
+        note.creation_date = datetime.fromisoformat(state["creation_date"])
+        note.modification_date = datetime.fromisoformat(state.get("modification_date", state["creation_date"]))
+        note.version = state.get("version", 0)
+        return note
+
+    # Binary form used by snapshots, the ID is stored as the entry key. The modification
+    # date comes last, snapshots written before it was kept simply end after the tags.
+    def to_bytes(self):
+        strings = [self.creation_date.isoformat(), self.text]
+        strings.extend(self.tag_names)
+        strings.append(self.modification_date.isoformat())
+        return _NOTE_HEADER.pack(self.version, len(self.tag_codes)) + pack_strings(strings)
+
+    @classmethod
+    def from_bytes(cls, note_id, payload):
+        version, tag_count = _NOTE_HEADER.unpack_from(payload)
+        creation_date, text, *rest = unpack_strings(payload, _NOTE_HEADER.size)
+        note = cls(text)
+        note.tags = rest[:tag_count]
+        note.creation_date = datetime.fromisoformat(creation_date)
+        note.modification_date = datetime.fromisoformat(rest[tag_count]) if len(rest) > tag_count else note.creation_date
+        note.version = version
+        return note
 
     # Add a tag to the note
     def add_tag(self, tag):
-        self.tags.append(Tag(tag))
+        self.tag_codes += (TAG_DICTIONARY.code(Tag(tag).value),)
+        self._changed()
 
     # Remove a tag from the note
     def remove_tag(self, tag):
-        for t in self.tags:
-            if t.value == tag:
-                self.tags.remove(t)
-                return
-        raise ValueError(f"Tag {tag} not found.")
+        code = TAG_DICTIONARY.codes.get(tag)
+        if code not in self.tag_codes:
+            raise ValueError(f"Tag {tag} not found.")
+        position = self.tag_codes.index(code)
+        self.tag_codes = self.tag_codes[:position] + self.tag_codes[position + 1:]
+        self._changed()
 
     # String representation of the note
     def __str__(self):
-        tags_str = f", tags: {'; '.join(t.value for t in self.tags)}" if self.tags else ""
+        tags_str = f", tags: {'; '.join(self.tag_names)}" if self.tag_codes else ""
         date_str = self.creation_date.strftime("%d.%m.%Y %H:%M:%S")
         return f"Note: {self.text}, created at: {date_str}{tags_str}"
 
@@ -457,41 +2226,109 @@ class Note:
     def to_dict(self):
         return {
             "Note": self.text,
-            "Tags": "; ".join(t.value for t in self.tags),
+            "Tags": "; ".join(self.tag_names),
             "Creation Date": self.creation_date.strftime("%d.%m.%Y %H:%M:%S")
         }
 
 
 # Class to represent a notebook
-class NoteBook(UserDict):
-    
-    # Add a new note to the notebook
+class NoteBook(Book):
+    item_class = Note
+    snapshot_kind = 2
+    index_factories = {
+        "tag": lambda: BitmapIndex(lambda note: note.tag_codes, TAG_DICTIONARY),
+        "text": lambda: TextIndex(lambda note: note.text),
+        "created": lambda: SortedIndex(lambda note: note.creation_date),
+        "modified": lambda: SortedIndex(lambda note: note.modification_date),
+        # Orders for listing, notes without tags come first
+        "id_order": KeyOrder,
+        "tag_order": TagOrder,
+    }
+    persisted_indexes = ("tag", "created", "modified", "tag_order")
+    # Listing orders by the name show-notes --sort knows them
+    SORT_ORDERS = {"id": "id_order", "tags": "tag_order", "date": "created"}
+
+    def __init__(self, *args, **kwargs):
+        self.next_id = 1
+        super().__init__(*args, **kwargs)
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.next_id = max(self.data, default=0) + 1
+
+    def _adopt(self, note_id, note):
+        note.id = note_id
+        return super()._adopt(note_id, note)
+
+    # Big-endian IDs keep binary snapshot entries in numeric order
+    def encode_key(self, note_id):
+        return note_id.to_bytes(8, "big")
+
+    def decode_key(self, data):
+        return int.from_bytes(data, "big")
+
+    # Add a new note to the notebook, a new ID never overwrites an existing note
     def add_note(self, note):
-        self.data[len(self.data) + 1] = note
+        with self.shared():
+            note.id = self.next_id
+            self.next_id += 1
+            note.book = self
+            self.data[note.id] = note
+            self.note_changed(note)
 
     # Delete a note by ID
     def delete_note(self, note_id):
-        if note_id in self.data:
-            del self.data[note_id]
-        else:
-            raise KeyError(f"Note {note_id} not found.")
+        with self.shared():
+            if note_id in self.data:
+                self.data.pop(note_id).book = None
+                self._log("del", note_id)
+            else:
+                raise KeyError(f"Note {note_id} not found.")
+
+    # Called by a note after every change
+    def note_changed(self, note):
+        self._commit(note.id, note, f"Note {note.id}")
+
+    def apply_entry(self, entry):
+        super().apply_entry(entry)
+        if entry["op"] == "put":
+            self.next_id = max(self.next_id, entry["key"] + 1)
 
-    # Search for notes by tag
+    # Search for notes by tag, in the order they were added
     def find_by_tag(self, tag):
-        found_notes = []
-        for note in self.data.values():
-            for t in note.tags:
-                if t.value == tag:
-                    found_notes.append(note)
-                    break
-        return found_notes
-
-    # Convert notebook to PrettyTable format
-    def to_table(self):
+        return [self.data[note_id] for note_id in sorted(self._index("tag").lookup(TAG_DICTIONARY.codes.get(tag)))]
+
+    # Search for notes by a tag expression like "work AND urgent NOT done" or "proj*", in ID order
+    def find_by_tags(self, expression):
+        note_ids = self._index("tag").query(expression, lambda: self.data)
+        return [self.data[note_id] for note_id in note_ids]
+
+    # Notes created (or, by="modified", last changed) from start to end inclusive, oldest first
+    def between(self, start, end, by="created"):
+        return [self.data[note_id] for _, note_id in self._index(by).range(start, end)]
+
+    # The count most recently created (or, by="modified", changed) notes, newest first
+    def latest(self, count, by="created"):
+        return [self.data[note_id] for _, note_id in self._index(by).last(count)]
+
+    # Search notes by content, best matches first, as (note, score) pairs
+    def search(self, query, limit=10):
+        return [(self.data[note_id], score) for note_id, score in self._index("text").search(query, limit)]
+
+    # All notes in one of SORT_ORDERS, read from an index that is kept in order as notes change
+    def sorted_notes(self, by="id"):
+        if by not in self.SORT_ORDERS:
+            raise ValueError(f"Notes can be sorted by {', '.join(self.SORT_ORDERS)}.")
+        for _, note_id in self._index(self.SORT_ORDERS[by]).entries:
+            yield self.data[note_id]
+
+    # Convert notebook to PrettyTable format, in the order the notes were added or sorted
+    def to_table(self, sort=None):
         table = PrettyTable()
         table.field_names = ["ID", "Note", "Tags", "Creation Date"]
-        for note_id, note in self.data.items():
-            table.add_row([note_id, note.to_dict()["Note"], note.to_dict()["Tags"], note.to_dict()["Creation Date"]])
+        notes = self.data.values() if sort is None else self.sorted_notes(sort)
+        for note in notes:
+            table.add_row([note.id, note.to_dict()["Note"], note.to_dict()["Tags"], note.to_dict()["Creation Date"]])
         return table
         
         
@@ -541,13 +2378,13 @@ def delete_tag(args, notebook):
     return "Tag deleted."
 
 
-# Function to find notes by tag
+# Function to find notes by tag or by an expression like: work AND urgent NOT done, proj*
 @input_error
 def find_by_tag(args, notebook):
     if len(args) < 1:
         raise ValueError("Give me tag please.")
-    tag = args[0]
-    found_notes = notebook.find_by_tag(tag)
+    tag = " ".join(args)
+    found_notes = notebook.find_by_tags(tag)
     if not found_notes:
         return f"No notes found with tag {tag}."
     table = PrettyTable()
@@ -557,27 +2394,96 @@ def find_by_tag(args, notebook):
     return table
 
 
-# Shows all notes in the notebook
-def show_notes(notebook):
+# Search notes by their text: words, "exact phrases" and prefixes like meet*
+@input_error
+def search_notes(args, notebook):
+    if len(args) < 1:
+        raise ValueError("Give me words to search for please.")
+    query = " ".join(args)
+    results = notebook.search(query)
+    if not results:
+        return f"No notes found for {query}."
+    table = PrettyTable()
+    table.field_names = ["ID", "Note", "Tags"]
+    for note, score in results:
+        table.add_row([note.id, note.to_dict()["Note"], note.to_dict()["Tags"]])
+    return table
+
+
+# Note dates are given as DD.MM.YYYY, the end date counts in full
+def _parse_note_date(value):
+    try:
+        return datetime.strptime(value, "%d.%m.%Y")
+    except ValueError:
+        raise ValueError("Invalid date format. Use DD.MM.YYYY")
+
+
+# Table of notes with their IDs and dates
+def _notes_table(notes):
+    table = PrettyTable()
+    table.field_names = ["ID", "Note", "Tags", "Creation Date"]
+    for note in notes:
+        table.add_row([note.id, note.to_dict()["Note"], note.to_dict()["Tags"], note.to_dict()["Creation Date"]])
+    return table
+
+
+# Show notes created between two dates, or changed between them with "modified" at the end
+@input_error
+def notes_between(args, notebook):
+    if len(args) < 2:
+        raise ValueError("Give me two dates DD.MM.YYYY please.")
+    start = _parse_note_date(args[0])
+    end = datetime.combine(_parse_note_date(args[1]).date(), time.max)
+    by = "modified" if len(args) > 2 and args[2].lower() == "modified" else "created"
+    notes = notebook.between(start, end, by)
+    if not notes:
+        return f"No notes {by} between {args[0]} and {args[1]}."
+    return _notes_table(notes)
+
+
+# Show the newest notes, 10 unless a number is given, by change time with "modified"
+@input_error
+def latest_notes(args, notebook):
+    count = 10
+    by = "created"
+    for arg in args:
+        if arg.isdigit():
+            count = int(arg)
+        elif arg.lower() == "modified":
+            by = "modified"
+        else:
+            raise ValueError("Use latest-notes [number] [modified].")
+    notes = notebook.latest(count, by)
+    if not notes:
+        return "No notes saved yet."
+    return _notes_table(notes)
+
+
+# Shows all notes in the notebook, optionally sorted: show-notes --sort tags|date|id
+@input_error
+def show_notes(args, notebook):
+    sort = None
+    if args:
+        option, _, value = args[0].partition("=")
+        if option != "--sort" or not (value or len(args) > 1):
+            raise ValueError(f"Use show-notes --sort {'|'.join(NoteBook.SORT_ORDERS)}.")
+        sort = (value or args[1]).lower()
+        if sort not in NoteBook.SORT_ORDERS:
+            raise ValueError(f"Use show-notes --sort {'|'.join(NoteBook.SORT_ORDERS)}.")
     if not notebook.data:
         return "No notes saved yet."
     else:
-        return notebook.to_table()
+        return notebook.to_table(sort)
 
 
 # Add the notes to a file
 def save_notes(notebook, filename="notes.pkl"):
-    with open(filename, "wb") as f:
-        pickle.dump(notebook, f)
+    _save_snapshot(notebook, filename)
 
 
 # Loads the notes from a file
 def load_notes(filename="notes.pkl"):
-    try:
-        with open(filename, "rb") as f:
-            return pickle.load(f)
-    except FileNotFoundError:
-        return NoteBook()
+    return _load_journaled(filename, NoteBook)
 
 
 @input_error
@@ -587,7 +2493,7 @@ def add_email(args, book):
     name, email = args[0], args[1]
     record = book.find(name)
     if not record:
-        raise KeyError(f"Contact {name} not found.")
+        raise KeyError(contact_not_found(book, name))
     record.add_email(email)
     return "Email added."
 
@@ -599,7 +2505,7 @@ def change_email(args, book):
     name, new_email = args[0], args[1]
     record = book.find(name)
     if not record:
-        raise KeyError(f"Contact {name} not found.")
+        raise KeyError(contact_not_found(book, name))
     record.edit_email(new_email)
     return "Email updated."
 
@@ -611,7 +2517,7 @@ def delete_email(args, book):
     name = args[0]
     record = book.find(name)
     if not record:
-        raise KeyError(f"Contact {name} not found.")
+        raise KeyError(contact_not_found(book, name))
     record.remove_email()
     return "Email deleted."
 
@@ -623,7 +2529,7 @@ def get_email(args, book):
     name = args[0]
     record = book.find(name)
     if not record:
-        raise KeyError(f"Contact {name} not found.")
+        raise KeyError(contact_not_found(book, name))
     if record.email:
         return f"{name}'s email is {record.email}"
     else:
@@ -637,7 +2543,7 @@ def add_address(args, book):
     name, address = args[0], " ".join(args[1:])
     record = book.find(name)
     if not record:
-        raise KeyError(f"Contact {name} not found.")
+        raise KeyError(contact_not_found(book, name))
     record.add_address(address)
     return "Address added."
 
@@ -649,7 +2555,7 @@ def change_address(args, book):
     name, new_address = args[0], " ".join(args[1:])
     record = book.find(name)
     if not record:
-        raise KeyError(f"Contact {name} not found.")
+        raise KeyError(contact_not_found(book, name))
     record.edit_address(new_address)
     return "Address updated."
 
@@ -661,7 +2567,7 @@ def delete_address(args, book):
     name = args[0]
     record = book.find(name)
     if not record:
-        raise KeyError(f"Contact {name} not found.")
+        raise KeyError(contact_not_found(book, name))
     record.remove_address()
     return "Address deleted."
 
@@ -673,23 +2579,128 @@ def get_address(args, book):
     name = args[0]
     record = book.find(name)
     if not record:
-        raise KeyError(f"Contact {name} not found.")
+        raise KeyError(contact_not_found(book, name))
     if record.address:
         return f"{name}'s address is {record.address}"
     else:
         return f"No address set for {name}."
 
 
+# Run one command against the books and print its result
+def run_command(command, args, book, notebook):
+    if command == "hello":
+        print("How can I help you?")
+        display_commands()
+    elif command == "add":
+        print(add_contact(args, book))
+    elif command == "change":
+        print(change_contact(args, book))
+    elif command == "phone":
+        result = get_contact(args, book)
+        if isinstance(result, PrettyTable):
+            print(result)
+        else:
+            print(result)
+    elif command == "find":
+        print(find_contacts(args, book))
+    elif command == "who":
+        print(who_is(args, book))
+    elif command == "phone-part":
+        print(find_by_phone_part(args, book))
+    elif command == "by-domain":
+        print(contacts_by_domain(args, book))
+    elif command == "by-address":
+        print(contacts_by_address(args, book))
+    elif command == "query":
+        print(query_contacts(args, book))
+    elif command == "add-email":
+        print(add_email(args, book))
+    elif command == "change-email":
+        print(change_email(args, book))
+    elif command == "delete-email":
+        print(delete_email(args, book))
+    elif command == "get-email":
+        print(get_email(args, book))
+    elif command == "add-address":
+        print(add_address(args, book))
+    elif command == "change-address":
+        print(change_address(args, book))
+    elif command == "delete-address":
+        print(delete_address(args, book))
+    elif command == "get-address":
+        print(get_address(args, book))
+    elif command == "all":
+        result = all_contacts(book)
+        if isinstance(result, PrettyTable):
+            print(result)
+        else:
+            print(result)
+    elif command == "delete":
+        print(delete_contact(args, book))
+    elif command == "add-birthday":
+        print(add_birthday(args, book))
+    elif command == "birthdays":
+        print(upcoming_birthdays(args, book))
+    elif command == "birthday-stats":
+        print(birthday_stats(args, book))
+    elif command == "show-birthday":
+        print(show_birthday(args, book))
+    elif command == "import":
+        print(import_file(args, book))
+    elif command == "add-note":
+        print(add_note(args, notebook))
+    elif command == "delete-note":
+        print(delete_note(args, notebook))
+    elif command == "add-tag":
+        print(add_tag(args, notebook))
+    elif command == "delete-tag":
+        print(delete_tag(args, notebook))
+    elif command == "find-tag":
+        result = find_by_tag(args, notebook)
+        if isinstance(result, PrettyTable):
+            print(result)
+        else:
+            print(result)
+    elif command == "search-notes":
+        print(search_notes(args, notebook))
+    elif command == "show-notes":
+        result = show_notes(args, notebook)
+        if isinstance(result, PrettyTable):
+            print(result)
+        else:
+            print(result)
+    elif command == "notes-between":
+        print(notes_between(args, notebook))
+    elif command == "latest-notes":
+        print(latest_notes(args, notebook))
+    elif command == "save":
+        print(save_all(book, notebook))
+    else:
+        print("Command not found! Please try again")
+
+
 # Main function to interact with the user
-def main():
-    book = load_data()
-    notebook = load_notes()
+def main(
+    book_file="addressbook.pkl", notes_file="notes.pkl", autosave_idle=5.0, autosave_changes=100, aliases=None,
+    columnar=False,
+):
+    resolver = CommandResolver(COMMANDS, {**ALIASES, **(aliases or {})})
+    book = load_data(book_file)
+    book.columnar = columnar
+    notebook = load_notes(notes_file)
+    # Commands and autosaves take turns on the books
+    autosave_lock = threading.RLock()
+    savers = [enable_autosave(b, autosave_idle, autosave_changes, autosave_lock) for b in (book, notebook)]
     print("Welcome to the assistant bot!")
     display_commands()
-    readline.set_completer(completer)
+    readline.set_completer(make_completer(book))
     readline.parse_and_bind("tab: complete")
     while True:
-        user_input = input("Please input command: ").strip()
+        try:
+            user_input = input("Please input command: ").strip()
+        except EOFError:
+            # End of a script piped in, save as on exit
+            user_input = "exit"
         if not user_input:
             print("Please enter a command.")
             continue
@@ -699,86 +2710,56 @@ def main():
         if command is None:
             print("Invalid input format.")
             continue
-        if command == "hello":
-            print("How can I help you?")
-            display_commands()
-        elif command == "add":
-            print(add_contact(args, book))
-        elif command == "change":
-            print(change_contact(args, book))
-        elif command == "phone":
-            result = get_contact(args, book)
-            if isinstance(result, PrettyTable):
-                print(result)
-            else:
-                print(result)
-        elif command == "add-email":
-            print(add_email(args, book))
-        elif command == "change-email":
-            print(change_email(args, book))
-        elif command == "delete-email":
-            print(delete_email(args, book))
-        elif command == "get-email":
-            print(get_email(args, book))
-        elif command == "add-address":
-            print(add_address(args, book))
-        elif command == "change-address":
-            print(change_address(args, book))
-        elif command == "delete-address":
-            print(delete_address(args, book))
-        elif command == "get-address":
-            print(get_address(args, book))
-        elif command == "all":
-            result = all_contacts(book)
-            if isinstance(result, PrettyTable):
-                print(result)
-            else:
-                print(result)
-        elif command == "delete":
-            print(delete_contact(args, book))
-        elif command == "add-birthday":
-            print(add_birthday(args, book))
-        elif command == "birthdays":
-            upcoming_birthdays = book.get_upcoming_birthdays()
-            if upcoming_birthdays:
-                table = PrettyTable()
-                table.field_names = ["Name", "Birthday"]
-                for name, birthday in upcoming_birthdays:
-                    table.add_row([name, birthday])
-                print("Upcoming birthdays in the next 7 days:")
-                print(table)
-            else:
-                print("No upcoming birthdays in the next 7 days.")
-        elif command == "show-birthday":
-            print(show_birthday(args, book))
-        elif command == "add-note":
-            print(add_note(args, notebook))
-        elif command == "delete-note":
-            print(delete_note(args, notebook))
-        elif command == "add-tag":
-            print(add_tag(args, notebook))
-        elif command == "delete-tag":
-            print(delete_tag(args, notebook))
-        elif command == "find-tag":
-            result = find_by_tag(args, notebook)
-            if isinstance(result, PrettyTable):
-                print(result)
-            else:
-                print(result)
-        elif command == "show-notes":
-            result = show_notes(notebook)
-            if isinstance(result, PrettyTable):
-                print(result)
+        command, suggestions = resolver.resolve(command)
+        if command is None:
+            if suggestions:
+                print(f"Command not found! Did you mean: {', '.join(suggestions)}?")
             else:
-                print(result)
-        elif command in ["exit", "close"]:
-            save_data(book)
-            save_notes(notebook)
-            print("Goodbye!")
-            break
-        else:
-            print("Command not found! Please try again")
+                print("Command not found! Please try again")
+            continue
+        if suggestions:
+            print(f"Assuming '{command}'.")
+        if command in NAME_COMMANDS:
+            args = parse_name_args(user_input)
+        with autosave_lock:
+            for shared_book in (book, notebook):
+                # Reap finished background saves and catch up with other sessions
+                if shared_book.background_save is not None:
+                    shared_book.background_save.poll()
+                shared_book.refresh()
+            if command in ["exit", "close"]:
+                for saver in savers:
+                    saver.close()
+                close_book(book)
+                close_book(notebook)
+                print("Goodbye!")
+                break
+            run_command(command, args, book, notebook)
+            book.command_done()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="mr.Jozef, a CLI assistant for contacts and notes.")
+    parser.add_argument("--book", default="addressbook.pkl", help="address book file, .db is stored in SQLite and .jzf as a binary snapshot")
+    parser.add_argument("--notes", default="notes.pkl", help="notes file, .jzf is stored as a binary snapshot")
+    parser.add_argument("--autosave-idle", type=float, default=5.0, help="save this many seconds after the last change, 0 turns it off")
+    parser.add_argument("--autosave-changes", type=int, default=100, help="save after this many changes, 0 turns it off")
+    parser.add_argument("--convert", nargs=2, metavar=("SOURCE", "TARGET"), help="convert a saved file, a .jzf target is a binary snapshot")
+    parser.add_argument("--alias", action="append", default=[], metavar="NAME=COMMAND", help="accept another word for a command, may be repeated")
+    parser.add_argument("--columnar", action="store_true", help="answer birthday reports from NumPy columns, needs NumPy")
+    cli_args = parser.parse_args()
+    if cli_args.columnar and numpy is None:
+        parser.error("--columnar needs NumPy: pip install numpy")
+    user_aliases = {}
+    for alias in cli_args.alias:
+        name, _, target = alias.partition("=")
+        if target.lower() not in COMMANDS:
+            parser.error(f"--alias {alias}: unknown command {target!r}")
+        user_aliases[name.lower()] = target.lower()
+    if cli_args.convert:
+        print(convert_data(*cli_args.convert))
+    else:
+        main(
+            cli_args.book, cli_args.notes, cli_args.autosave_idle, cli_args.autosave_changes, user_aliases,
+            cli_args.columnar,
+        )
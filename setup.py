@@ -13,6 +13,9 @@ setup(
     install_requires=[
         "prettytable",
     ],
+    extras_require={
+        "columnar": ["numpy"],
+    },
     entry_points={
         "console_scripts": [
             "mrjozef=mrjozef.main:main",
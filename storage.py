@@ -0,0 +1,399 @@
+import json
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+# Append-only journal of book changes, one JSON entry per line. Several processes may
+# append to the same journal under a FileLock and follow each other's entries.
+class Journal:
+    def __init__(self, path):
+        self.path = path
+        self.rotated_path = f"{path}.old"
+        self.file = None
+        self.reader = None
+
+    # Write one entry and make sure it reaches the disk before returning
+    def append(self, entry):
+        self.append_many([entry])
+
+    # Write several entries with a single write and a single sync
+    def append_many(self, entries):
+        # Another process may have rotated or reset the journal since the last write
+        if self.file is not None and not _same_file(self.file, self.path):
+            self.close()
+        if self.file is None:
+            self.file = open(self.path, "ab")
+            # Terminate a line torn by a crash so it cannot swallow the next entry
+            if self.file.tell() and not _ends_with_newline(self.path):
+                self.file.write(b"\n")
+        lines = "".join(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n" for entry in entries)
+        self.file.write(lines.encode("utf-8"))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    # Read all entries back, the rotated part first, and keep following the journal
+    def read(self):
+        try:
+            with open(self.rotated_path, "rb") as f:
+                yield from _read_entries(f)
+        except FileNotFoundError:
+            pass
+        yield from self.read_new()
+
+    # Entries appended since the last call, following the journal across rotations and resets
+    def read_new(self):
+        entries = []
+        while True:
+            if self.reader is not None:
+                entries.extend(_read_entries(self.reader))
+                if _same_file(self.reader, self.path):
+                    return entries
+                self.reader.close()
+                self.reader = None
+            try:
+                self.reader = open(self.path, "rb")
+            except FileNotFoundError:
+                return entries
+
+    # Move the current entries aside so new ones start a fresh file while a snapshot is written
+    def rotate(self):
+        self.close()
+        if not os.path.exists(self.path):
+            return
+        if os.path.exists(self.rotated_path):
+            # Left over from a snapshot that failed, keep both parts in order
+            with open(self.path, "rb") as src, open(self.rotated_path, "ab") as dst:
+                dst.write(src.read())
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.rotated_path)
+
+    # Drop the rotated entries once a snapshot covers them
+    def drop_rotated(self):
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    # Drop all entries once they are covered by a snapshot
+    def reset(self):
+        self.close()
+        self.drop_rotated()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    # Bytes of entries not yet covered by a snapshot, the rotated part included
+    def size(self):
+        total = 0
+        for path in (self.path, self.rotated_path):
+            try:
+                total += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return total
+
+
+# Complete lines from the current position; a torn last line is left for the next read
+def _read_entries(f):
+    entries = []
+    while True:
+        position = f.tell()
+        line = f.readline()
+        if not line.endswith(b"\n"):
+            f.seek(position)
+            return entries
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+
+
+def _same_file(f, path):
+    try:
+        return os.fstat(f.fileno()).st_ino == os.stat(path).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+# Exclusive lock shared by all processes that work with the same file, the holder may take it again
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.depth = 0
+
+    def acquire(self, blocking=True):
+        if self.depth:
+            self.depth += 1
+            return True
+        f = open(self.path, "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self.file = f
+        self.depth = 1
+        return True
+
+    def release(self):
+        self.depth -= 1
+        if self.depth:
+            return
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.file.close()
+        self.file = None
+
+    # Hand the lock over to a forked child: it is released when the child exits
+    def detach(self):
+        self.file.close()
+        self.file = None
+        self.depth = 0
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+# Write a file so that readers see either the old or the new version, never a partial one
+def atomic_write(filename, data):
+    tmp_name = f"{filename}.tmp"
+    with open(tmp_name, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_name, filename)
+
+
+# Snapshot written without blocking the caller. A forked child writes the copy-on-write
+# image of the parent's memory; where fork is unavailable the data is serialized up front
+# and only the write happens in a thread. The snapshot lock, when given, is held until the
+# snapshot is written, and the rotated journal is dropped before it is released.
+class BackgroundSave:
+    def __init__(self, filename, serialize, journal=None, lock=None):
+        self.filename = filename
+        self.journal = journal
+        self.lock = lock
+        self.pid = None
+        self.thread = None
+        self.running = True
+        self.succeeded = False
+        if lock is not None and not lock.acquire(blocking=False):
+            raise BlockingIOError("Another snapshot is being written.")
+        if journal is not None:
+            journal.rotate()
+        if hasattr(os, "fork"):
+            self.pid = os.fork()
+            if self.pid == 0:
+                code = 0
+                try:
+                    self._write(serialize())
+                except BaseException:
+                    code = 1
+                os._exit(code)
+            if lock is not None:
+                lock.detach()
+        else:
+            self.thread = threading.Thread(target=self._write_and_release, args=(serialize(),), daemon=True)
+            self.thread.start()
+
+    # On failure the rotated entries stay and are replayed on the next load
+    def _write(self, data):
+        atomic_write(self.filename, data)
+        if self.journal is not None:
+            self.journal.drop_rotated()
+
+    def _write_and_release(self, data):
+        try:
+            self._write(data)
+            self.succeeded = True
+        except OSError:
+            self.succeeded = False
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+    # Check whether the snapshot is finished, optionally waiting for it
+    def poll(self, wait=False):
+        if not self.running:
+            return True
+        if self.pid is not None:
+            pid, status = os.waitpid(self.pid, 0 if wait else os.WNOHANG)
+            if pid == 0:
+                return False
+            self.succeeded = os.waitstatus_to_exitcode(status) == 0
+        else:
+            self.thread.join(None if wait else 0)
+            if self.thread.is_alive():
+                return False
+        self.running = False
+        return True
+
+
+SNAPSHOT_MAGIC = b"JOZF"
+SNAPSHOT_VERSION = 2
+_HEADER = struct.Struct("<4sHBxIQQ")
+_OFFSET = struct.Struct("<Q")
+_LENGTH = struct.Struct("<I")
+
+
+# Length-prefixed UTF-8 strings, the building block of snapshot entries
+def pack_strings(strings):
+    parts = []
+    for string in strings:
+        data = string.encode("utf-8")
+        parts.append(_LENGTH.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+# Without a count the strings run to the end of the buffer
+def unpack_strings(buffer, offset, count=None):
+    strings = []
+    while len(strings) != count and offset < len(buffer):
+        (length,) = _LENGTH.unpack_from(buffer, offset)
+        offset += _LENGTH.size
+        strings.append(str(buffer[offset:offset + length], "utf-8"))
+        offset += length
+    return strings
+
+
+# Binary snapshot: a header, a table with the offset of every entry, then the entries.
+# Every entry is length-prefixed and starts with its key; entries are sorted by key so a
+# single one can be found by binary search without reading the others.
+def encode_snapshot(kind, entries, journal_seq=0, next_id=0):
+    entries = list(entries)
+    position = _HEADER.size + _OFFSET.size * len(entries)
+    offsets = []
+    chunks = []
+    for key, payload in entries:
+        offsets.append(position)
+        chunk = _LENGTH.pack(_LENGTH.size + len(key) + len(payload)) + _LENGTH.pack(len(key)) + key + payload
+        chunks.append(chunk)
+        position += len(chunk)
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, kind, len(entries), journal_seq, next_id)
+    return b"".join([header, struct.pack(f"<{len(offsets)}Q", *offsets)] + chunks)
+
+
+# Read-only view of a binary snapshot, mapped into memory instead of read at once
+class SnapshotFile:
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map.size() < _HEADER.size:
+            raise ValueError(f"{filename} is not a snapshot file.")
+        magic, version, self.kind, self.count, self.journal_seq, self.next_id = _HEADER.unpack_from(self.map)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{filename} is not a snapshot file.")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}.")
+
+    def _entry_start(self, index):
+        (offset,) = _OFFSET.unpack_from(self.map, _HEADER.size + _OFFSET.size * index)
+        return offset + _LENGTH.size
+
+    # Key of the entry at the given position
+    def key(self, index):
+        start = self._entry_start(index)
+        (key_length,) = _LENGTH.unpack_from(self.map, start)
+        return self.map[start + _LENGTH.size:start + _LENGTH.size + key_length]
+
+    # Key and payload of the entry at the given position
+    def entry(self, index):
+        start = self._entry_start(index)
+        (length,) = _LENGTH.unpack_from(self.map, start - _LENGTH.size)
+        (key_length,) = _LENGTH.unpack_from(self.map, start)
+        key_end = start + _LENGTH.size + key_length
+        return self.map[start + _LENGTH.size:key_end], self.map[key_end:start + length]
+
+    # Position of the entry with the given key, or -1
+    def find(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self.key(low) == key:
+            return low
+        return -1
+
+    def close(self):
+        self.map.close()
+
+
+# Coalesces bursts of changes into a single save: it runs once no change has arrived for
+# idle_seconds, or straight away after max_changes changes. Callers hold the lock while
+# they modify the data, the save runs under the same lock.
+class AutoSaver:
+    def __init__(self, save, idle_seconds=5.0, max_changes=100, lock=None):
+        self.save = save
+        self.idle_seconds = idle_seconds
+        self.max_changes = max_changes
+        self.lock = lock or threading.RLock()
+        self.changes = 0
+        self.timer = None
+
+    # Record one change, saving now or restarting the idle countdown
+    def changed(self):
+        with self.lock:
+            self.changes += 1
+            if self.max_changes and self.changes >= self.max_changes:
+                self.flush()
+            elif self.idle_seconds:
+                self._schedule()
+
+    def _schedule(self):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = threading.Timer(self.idle_seconds, self.flush)
+        self.timer.daemon = True
+        self.timer.start()
+
+    # Save pending changes; a save that cannot run yet (returns False) is retried later
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.changes:
+                return
+            if self.save() is False:
+                self._schedule()
+            else:
+                self.changes = 0
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
@@ -0,0 +1,39 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jozef import ALIASES, COMMANDS, CommandResolver
+
+
+# A mistyped command is run when a single command is one neighbouring key away, deleting
+# commands and exit are only suggested
+class CommandResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.resolver = CommandResolver(COMMANDS, ALIASES)
+
+    def test_known_commands_and_aliases(self):
+        self.assertEqual(self.resolver.resolve("all"), ("all", []))
+        self.assertEqual(self.resolver.resolve("list"), ("all", []))
+
+    def test_slip_to_a_neighbouring_key_is_run(self):
+        self.assertEqual(self.resolver.resolve("sll"), ("all", ["all"]))
+        self.assertEqual(self.resolver.resolve("lisr"), ("all", ["all"]))
+
+    def test_deleting_commands_are_only_suggested(self):
+        self.assertEqual(self.resolver.resolve("delte"), (None, ["delete"]))
+        self.assertEqual(self.resolver.resolve("exot"), (None, ["exit"]))
+
+    def test_unknown_word_suggests_nothing(self):
+        self.assertEqual(self.resolver.resolve("xyzzy"), (None, []))
+
+    def test_guess_is_remembered(self):
+        self.resolver.resolve("sll")
+        with mock.patch.object(self.resolver.tree, "search", side_effect=AssertionError("searched again")):
+            self.assertEqual(self.resolver.resolve("sll"), ("all", ["all"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
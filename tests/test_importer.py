@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from importer import parse_csv, read_chunks
+from jozef import AddressBook, get_contact, import_contacts, parse_name_args
+
+CSV = (
+    "Name,Phone,Email\n"
+    "Ann,0501234567,ann@example.com\n"
+    "   \n"
+    "\n"
+    'Dora Smith,0671112233,"dora\n'
+    '\n'
+    '@example.com"\n'
+    "Bob,0631112233,broken\n"
+)
+
+
+class ImportCsvTest(unittest.TestCase):
+    def test_blank_lines_are_not_contacts(self):
+        lines = CSV.splitlines(keepends=True)[1:]
+        chunks = list(read_chunks(lines, "csv", 2))
+        self.assertEqual([first for first, _ in chunks], [0, 2])
+        header = ["name", "phones", "email"]
+        self.assertEqual([len(parse_csv(header, chunk)["name"]) for _, chunk in chunks], [2, 1])
+
+    def test_rejected_rows_keep_their_numbers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "contacts.csv")
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write(CSV)
+            book = AddressBook()
+            imported, rejected = import_contacts(book, filename, workers=1, chunk_size=1)
+        self.assertEqual(imported, 2)
+        self.assertEqual([(row, field) for row, field, _ in rejected], [(3, "email")])
+
+    def test_contacts_without_phones(self):
+        with tempfile.TemporaryDirectory() as directory:
+            csv_file = os.path.join(directory, "contacts.csv")
+            with open(csv_file, "w", encoding="utf-8") as f:
+                f.write("Name,Phone,Email,Birthday\nAnn,0501234567,,\nBob,,bob@example.com,\nEve,,,01.02.1990\n")
+            vcard_file = os.path.join(directory, "contacts.vcf")
+            with open(vcard_file, "w", encoding="utf-8") as f:
+                f.write("BEGIN:VCARD\nFN:Dan\nEMAIL:dan@example.com\nEND:VCARD\n")
+            book = AddressBook()
+            self.assertEqual(import_contacts(book, csv_file, workers=1), (3, []))
+            self.assertEqual(import_contacts(book, vcard_file, workers=1), (1, []))
+        self.assertEqual(book.find("Bob").phones, [])
+        self.assertEqual(book.find("Bob").email.value, "bob@example.com")
+        self.assertEqual(book.find("Dan").phones, [])
+
+
+class NameArgumentsTest(unittest.TestCase):
+    def test_quoted_names(self):
+        self.assertEqual(parse_name_args('phone "Dora Smith"'), ["Dora Smith"])
+        self.assertEqual(parse_name_args("add-address Ann O'Brien St"), ["Ann", "O'Brien", "St"])
+
+    def test_imported_name_with_spaces_is_reachable(self):
+        book = AddressBook()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "contacts.vcf")
+            with open(filename, "w", encoding="utf-8") as f:
+                f.write("BEGIN:VCARD\nFN:Dora Smith\nTEL:0501234567\nEND:VCARD\n")
+            import_contacts(book, filename, workers=1)
+        self.assertIn("0501234567", str(get_contact(parse_name_args('phone "Dora Smith"'), book)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import pickle
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columns import numpy
+from indexes import BitmapIndex, SortedIndex, TrigramIndex
+from jozef import AddressBook, Note, NoteBook, Record
+
+
+def _address_book():
+    book = AddressBook()
+    record = Record("Ann")
+    record.add_phone("0501234567")
+    record.add_birthday("01.03.1990")
+    record.add_email("ann@example.com")
+    record.add_address("Kyiv, Street 1")
+    book.add_record(record)
+    return book
+
+
+def _notebook():
+    notebook = NoteBook()
+    note = Note("hello team")
+    note.add_tag("work")
+    notebook.add_note(note)
+    return notebook
+
+
+# Every index of both books can be built and kept up to date as items change
+class IndexFactoriesTest(unittest.TestCase):
+    def check_indexes(self, book, key, change):
+        for number, name in enumerate(book.index_factories):
+            if name == "columns" and numpy is None:
+                continue
+            with self.subTest(index=name):
+                book.indexes.clear()
+                book._index(name)
+                book._reindex(key)
+                change(number)
+
+    def test_address_book(self):
+        book = _address_book()
+        self.check_indexes(book, "Ann", lambda number: book.find("Ann").add_phone(f"067111{number:04d}"))
+
+    def test_notebook(self):
+        notebook = _notebook()
+        key = next(iter(notebook.data))
+        self.check_indexes(notebook, key, lambda number: notebook.data[key].add_tag(f"tag{number}"))
+
+    def test_search_notes(self):
+        notebook = _notebook()
+        self.assertTrue(notebook.search("team"))
+
+
+# NOT is answered from the bitmap of all notes kept in the tag index
+class TagQueryTest(unittest.TestCase):
+    def setUp(self):
+        self.notebook = NoteBook()
+        for text, tags in (("a", ["work"]), ("b", []), ("c", ["work", "done"])):
+            note = Note(text)
+            for tag in tags:
+                note.add_tag(tag)
+            self.notebook.add_note(note)
+
+    def texts(self, expression, notebook=None):
+        return [note.text for note in (notebook or self.notebook).find_by_tags(expression)]
+
+    def test_not_follows_added_and_deleted_notes(self):
+        self.assertEqual(self.texts("NOT done"), ["a", "b"])
+        self.notebook.add_note(Note("d"))
+        self.assertEqual(self.texts("NOT done"), ["a", "b", "d"])
+        self.notebook.delete_note(next(iter(self.notebook.data)))
+        self.assertEqual(self.texts("NOT done"), ["b", "d"])
+
+    def test_not_after_loading(self):
+        self.assertEqual(self.texts("NOT work", pickle.loads(pickle.dumps(self.notebook))), ["b"])
+
+    def test_older_dump_without_items(self):
+        index = BitmapIndex(lambda item: item)
+        index.load({"work": {1}})
+        self.assertEqual(index.query("NOT work", lambda: [1, 2]), [2])
+
+    def test_cached_bitmaps_follow_changes(self):
+        index = BitmapIndex(lambda item: item)
+        for item_key, keys in ((1, ["work"]), (2, []), (3, ["work", "done"])):
+            index.update(item_key, keys)
+        self.assertEqual(index.query("work AND NOT done", lambda: []), [1])
+        with mock.patch("indexes.bitmap_from", side_effect=AssertionError("bitmap rebuilt")):
+            index.update(2, ["work"])
+            index.update(4, ["done"])
+            index.update(3, ["work"])
+            self.assertEqual(index.query("work AND NOT done", lambda: []), [1, 2, 3])
+            index.update(1, None)
+            self.assertEqual(index.query("NOT done", lambda: []), [2, 3])
+
+    def test_keyed_by_tag_codes(self):
+        index = self.notebook._index("tag")
+        self.assertTrue(all(isinstance(key, int) for key in index.postings))
+        self.assertEqual(self.texts("wo*"), ["a", "c"])
+        self.assertEqual(self.texts("unknown OR done"), ["c"])
+        self.assertEqual([note.text for note in self.notebook.find_by_tag("done")], ["c"])
+
+    def test_dumps_hold_tag_names(self):
+        postings, _ = self.notebook._index("tag").dump()
+        self.assertEqual(sorted(postings), ["done", "work"])
+        self.assertCountEqual([set(names) for names, _ in self.notebook._index("tag_order").dump()],
+                              [set(), {"done", "work"}, {"work"}])
+        loaded = pickle.loads(pickle.dumps(self.notebook))
+        self.assertEqual(self.texts("work AND NOT done", loaded), ["a"])
+        self.assertEqual(loaded._index("tag_order").entries, self.notebook._index("tag_order").entries)
+
+    def test_tags_cannot_be_changed_in_place(self):
+        note = next(iter(self.notebook.data.values()))
+        with self.assertRaises(AttributeError):
+            note.tags.append(note.tags[0])
+
+
+class SortedIndexTest(unittest.TestCase):
+    def test_count_follows_updates_and_loads(self):
+        index = SortedIndex(lambda item: item)
+        index.update_many((key, key % 10) for key in range(SortedIndex.BATCH))
+        index.update(3, 7)
+        index.update(5, None)
+        self.assertEqual(index.count(3, 7), len(list(index.range(3, 7))))
+        self.assertEqual(index.count(3, 7), 49)
+        loaded = SortedIndex(lambda item: item)
+        loaded.load(pickle.loads(pickle.dumps(index.dump())))
+        self.assertEqual(loaded.count(3, 7), 49)
+        self.assertEqual(loaded.count(10, 20), 0)
+
+
+class TrigramIndexTest(unittest.TestCase):
+    def test_common_trigrams_read_only_the_rarest(self):
+        index = TrigramIndex()
+        for name in ("Anna", "Annabel", "Hanna"):
+            index.update(name, name)
+        index.MAX_POSTINGS = 0
+        read = []
+        lookup = index.lookup
+        index.lookup = lambda gram: read.append(gram) or lookup(gram)
+        index.count = lambda gram: len(lookup(gram))
+        self.assertEqual(index.similar("Anna", 1, 0), ["Anna"])
+        # One lookup per trigram to find the usable ones, then the rarest one alone
+        self.assertEqual(len(read), len(set(read)) + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jozef
+from jozef import AddressBook, add_contact, close_book, flush_book, load_data, save_data, save_in_background
+from storage import FileLock
+
+
+# Changes live in the journal, so exit and autosave only rewrite the data file once the
+# journal is large
+class CloseBookTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, "addressbook.pkl")
+        save_data(AddressBook(), self.filename)
+        self.saved = os.stat(self.filename).st_mtime_ns
+
+    def test_unchanged_book_is_not_written(self):
+        close_book(load_data(self.filename))
+        self.assertEqual(os.stat(self.filename).st_mtime_ns, self.saved)
+
+    def test_changes_stay_in_the_journal(self):
+        book = load_data(self.filename)
+        add_contact(["Ann", "0501234567"], book)
+        close_book(book)
+        self.assertEqual(os.stat(self.filename).st_mtime_ns, self.saved)
+        self.assertTrue(os.path.getsize(f"{self.filename}.journal"))
+        self.assertIsNotNone(load_data(self.filename).find("Ann"))
+
+    def test_large_journal_is_compacted(self):
+        book = load_data(self.filename)
+        add_contact(["Ann", "0501234567"], book)
+        with mock.patch.object(jozef, "COMPACT_JOURNAL_SIZE", 1):
+            close_book(book)
+        book.background_save.poll(wait=True)
+        self.assertFalse(os.path.exists(f"{self.filename}.journal.old"))
+        self.assertIsNotNone(load_data(self.filename).find("Ann"))
+
+    def test_autosave_leaves_changes_in_the_journal(self):
+        book = load_data(self.filename)
+        add_contact(["Ann", "0501234567"], book)
+        self.assertTrue(flush_book(book))
+        self.assertIsNone(book.background_save)
+        self.assertEqual(os.stat(self.filename).st_mtime_ns, self.saved)
+        with mock.patch.object(jozef, "COMPACT_JOURNAL_SIZE", 1):
+            self.assertTrue(flush_book(book))
+        book.background_save.poll(wait=True)
+        self.assertFalse(book.dirty)
+        close_book(book)
+        self.assertIsNotNone(load_data(self.filename).find("Ann"))
+
+
+# A session that starts while a background save runs waits for it instead of reading the
+# old snapshot and a rotated journal the save is about to drop
+class LoadDuringSaveTest(unittest.TestCase):
+    def test_load_waits_for_the_snapshot_lock(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "addressbook.pkl")
+            save_data(AddressBook(), filename)
+            writer = load_data(filename)
+            add_contact(["Ann", "0501234567"], writer)
+            snapshot_lock = FileLock(f"{filename}.snapshot.lock")
+            snapshot_lock.acquire()
+            loaded = []
+            reader = threading.Thread(target=lambda: loaded.append(load_data(filename)))
+            reader.start()
+            reader.join(0.3)
+            self.assertTrue(reader.is_alive())
+            snapshot_lock.release()
+            reader.join()
+            self.assertIsNotNone(loaded[0].find("Ann"))
+
+    def test_load_after_background_save(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "addressbook.pkl")
+            save_data(AddressBook(), filename)
+            writer = load_data(filename)
+            add_contact(["Ann", "0501234567"], writer)
+            save_in_background(writer)
+            book = load_data(filename)
+            writer.background_save.poll(wait=True)
+            self.assertIsNotNone(book.find("Ann"))
+
+
+if __name__ == "__main__":
+    unittest.main()
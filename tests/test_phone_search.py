@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexes import NgramIndex
+from jozef import AddressBook, add_contact, load_data
+
+
+class NgramIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = NgramIndex(lambda values: values)
+        self.index.update("Ann", ["380501234567", "0501234567"])
+        self.index.update("Bob", ["380671114567"])
+        self.index.update("Eve", ["380931112233"])
+
+    def test_containing(self):
+        self.assertCountEqual(self.index.containing("4567"), ["Ann", "Bob"])
+        self.assertEqual(list(self.index.containing("05012")), ["Ann"])
+        self.assertEqual(list(self.index.containing("4576")), [])
+
+    def test_text_shorter_than_a_piece(self):
+        self.assertCountEqual(self.index.containing("93"), ["Eve"])
+
+    def test_removed_values(self):
+        self.index.update("Bob", None)
+        self.assertEqual(list(self.index.containing("4567")), ["Ann"])
+
+
+# A phone is found by part of its national form (050...) as well as of its E.164 form
+# (+38050...), in the in-memory book and in SQLite alike
+class FindByPhonePartTest(unittest.TestCase):
+    def books(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        sqlite_book = load_data(os.path.join(directory.name, "contacts.db"))
+        self.addCleanup(sqlite_book.connection.close)
+        return {"memory": AddressBook(), "sqlite": sqlite_book}
+
+    def test_national_and_e164_forms(self):
+        for kind, book in self.books().items():
+            with self.subTest(kind):
+                add_contact(["Ann", "0501234567"], book)
+                add_contact(["Bob", "+380671114567"], book)
+                add_contact(["Eve", "0931112233"], book)
+                for digits, names in (
+                    ("4567", ["Ann", "Bob"]),
+                    ("0501234", ["Ann"]),
+                    ("+38050", ["Ann"]),
+                    ("067111", ["Bob"]),
+                    ("050 123", ["Ann"]),
+                    ("99", []),
+                ):
+                    found = [record.name.value for batch in book.find_by_phone_part(digits) for record in batch]
+                    self.assertCountEqual(found, names, digits)
+
+    def test_batches(self):
+        for kind, book in self.books().items():
+            with self.subTest(kind):
+                for number in range(5):
+                    add_contact([f"Contact{number}", f"050123456{number}"], book)
+                batches = list(book.find_by_phone_part("3456", batch_size=2))
+                self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jozef import Record, canonical_phone
+
+
+class CanonicalPhoneTest(unittest.TestCase):
+    def test_formats_of_one_number(self):
+        for phone in ("0501234567", "(050) 123-45-67", "380501234567", "+380 50 123 45 67", "00380501234567"):
+            with self.subTest(phone=phone):
+                self.assertEqual(canonical_phone(phone), 380501234567)
+
+    def test_other_countries_need_a_plus(self):
+        self.assertEqual(canonical_phone("+14155552671"), 14155552671)
+
+    def test_invalid_numbers(self):
+        for phone in ("1234567", "5012345678", "050123456", "+0501234567", "phone"):
+            with self.subTest(phone=phone):
+                self.assertRaises(ValueError, canonical_phone, phone)
+
+
+class RecordPhonesTest(unittest.TestCase):
+    def test_edit_phone_rejects_a_number_the_record_has(self):
+        record = Record("Ann")
+        record.add_phone("0501234567")
+        record.add_phone("0671112233")
+        self.assertRaises(ValueError, record.edit_phone, "0671112233", "+380501234567")
+        self.assertEqual([phone.value for phone in record.phones], ["0501234567", "0671112233"])
+
+    def test_edit_phone_may_rewrite_the_same_number(self):
+        record = Record("Ann")
+        record.add_phone("0501234567")
+        record.edit_phone("0501234567", "+380501234567")
+        self.assertEqual([phone.value for phone in record.phones], ["+380501234567"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexes import TextIndex
+from jozef import Note, NoteBook
+
+
+# Ranked full-text search over notes: words, "quoted phrases" and prefixes (word*)
+class NoteSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.notebook = NoteBook()
+        for text in (
+            "buy fresh milk today",
+            "the milk is fresh",
+            "milk milk milk for the cat",
+            "call the plumber",
+            "milestone review",
+        ):
+            self.notebook.add_note(Note(text))
+
+    def texts(self, query):
+        return [note.text for note, _ in self.notebook.search(query)]
+
+    def test_more_occurrences_rank_higher(self):
+        self.assertEqual(self.texts("milk")[0], "milk milk milk for the cat")
+        self.assertCountEqual(self.texts("milk"), ["buy fresh milk today", "the milk is fresh", "milk milk milk for the cat"])
+
+    def test_rare_word_outweighs_common_one(self):
+        index = TextIndex(lambda text: text)
+        for key, text in enumerate(("common rare", "common common", "common")):
+            index.update(key, text)
+        self.assertEqual([key for key, _ in index.search("common rare")], [0])
+        self.assertGreater(dict(index.search("rare"))[0], dict(index.search("common"))[0])
+
+    def test_every_word_has_to_match(self):
+        self.assertCountEqual(self.texts("fresh milk"), ["buy fresh milk today", "the milk is fresh"])
+        self.assertEqual(self.texts("fresh plumber"), [])
+
+    def test_phrase_words_have_to_be_adjacent(self):
+        self.assertEqual(self.texts('"fresh milk"'), ["buy fresh milk today"])
+        self.assertEqual(self.texts('"milk fresh"'), [])
+        self.assertEqual(self.texts('"milk milk"'), ["milk milk milk for the cat"])
+
+    def test_prefix(self):
+        self.assertCountEqual(self.texts("mil*"), [
+            "buy fresh milk today", "the milk is fresh", "milk milk milk for the cat", "milestone review",
+        ])
+        self.assertEqual(self.texts("mil* review"), ["milestone review"])
+        self.assertEqual(self.texts("plum*"), ["call the plumber"])
+
+    def test_deleted_notes_are_not_found(self):
+        note_id = next(note_id for note_id, note in self.notebook.data.items() if note.text == "call the plumber")
+        self.notebook.delete_note(note_id)
+        self.assertEqual(self.texts("plumber"), [])
+        self.assertEqual(len(self.texts("the")), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jozef import AddressBook, Record, load_data, save_data
+
+
+# A full pass over a .jzf book gives the same contacts as looking each one up
+class SnapshotItemsTest(unittest.TestCase):
+    def test_items_follow_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "addressbook.jzf")
+            book = AddressBook()
+            for name in ("Ann", "Bob", "Eve"):
+                book.data[name] = Record(name)
+            save_data(book, filename)
+            book = load_data(filename)
+            book.find("Bob").add_phone("0501234567")
+            book.delete("Eve")
+            book.add_record(Record("Dan"))
+            items = dict(book.data.items())
+            self.assertEqual(sorted(items), ["Ann", "Bob", "Dan"])
+            self.assertIs(items["Bob"], book.find("Bob"))
+            self.assertEqual([phone.value for phone in items["Bob"].phones], ["0501234567"])
+            self.assertEqual(len(list(book.data.values())), len(book.data))
+
+
+if __name__ == "__main__":
+    unittest.main()
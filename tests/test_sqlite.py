@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jozef import add_contact, load_data
+
+
+# Two sessions on one SQLite address book see each other's changes after every command
+class SQLiteSessionsTest(unittest.TestCase):
+    def test_changes_are_committed_after_each_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "contacts.db")
+            first, second = load_data(filename), load_data(filename)
+            self.assertEqual(add_contact(["Ann", "0501234567"], first), "Contact added.")
+            first.command_done()
+            second.refresh()
+            self.assertIsNotNone(second.find("Ann"))
+            self.assertEqual(add_contact(["Bob", "0671234567"], second), "Contact added.")
+            second.command_done()
+            first.refresh()
+            self.assertIsNotNone(first.find("Bob"))
+            first.connection.close()
+            second.connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -17,6 +17,10 @@ class Field:
 class Name(Field):
     pass
 
+PHONE_INTERNATIONAL = re.compile(r'^\+?[0-9]{1,3}?[-. ]?\(?\d{1,4}?\)?[-. ]?\d{1,4}[-. ]?\d{1,4}[-. ]?\d{1,9}$')
+PHONE_LOCAL = re.compile(r'^\d{10}$')
+EMAIL = re.compile(r"[^@]+@[^@]+\.[^@]+")
+
 class Phone(Field):
     def __init__(self, value):
         if not self.is_valid_phone(value):
@@ -27,9 +31,7 @@ class Phone(Field):
     def is_valid_phone(phone):
         if not phone or not isinstance(phone, str):
             return False
-        phone_international = r'^\+?[0-9]{1,3}?[-. ]?\(?\d{1,4}?\)?[-. ]?\d{1,4}[-. ]?\d{1,4}[-. ]?\d{1,9}$'
-        phone_local = r'^\d{10}$'
-        return bool(re.match(phone_international, phone)) or bool(re.fullmatch(phone_local, phone))
+        return bool(PHONE_INTERNATIONAL.match(phone)) or bool(PHONE_LOCAL.fullmatch(phone))
 
 class Email(Field):
     def __init__(self, value):
@@ -39,7 +41,7 @@ class Email(Field):
 
     @staticmethod
     def is_valid_email(email):
-        return re.fullmatch(r"[^@]+@[^@]+\.[^@]+", email) is not None
+        return EMAIL.fullmatch(email) is not None
 
 class Address(Field):
     def __init__(self, value):